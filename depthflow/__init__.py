@@ -25,5 +25,8 @@ os.environ.setdefault("PYTORCH_ENABLE_MPS_FALLBACK", "1")
 # Make telemetries opt-in
 os.environ.setdefault("HF_HUB_DISABLE_TELEMETRY", "1")
 
+# Persist torch.compile artifacts across runs
+os.environ.setdefault("TORCHINDUCTOR_CACHE_DIR", str(dirs.user_cache_path/"inductor"))
+
 # Note: We don't import DepthScene for pure estimators usage,
 #   to avoid importing shaderflow, moderngl, imgui, etc.
@@ -4,16 +4,43 @@ from typing import Annotated
 from cyclopts import App, Parameter
 
 
+def overview() -> None:
+    """Print the scene's root help without importing it, nor the rendering stack and models.
+    Commands are listed from the same table as DepthScene's, each one's own help imports it"""
+    from shaderflow.ffmpeg import FFmpeg
+
+    import depthflow
+    from depthflow.commands import COMMANDS, ESTIMATORS, GROUP
+
+    cli = App(help=depthflow.__about__, version=depthflow.__version__,
+        help_flags=["--help"], usage="")
+
+    for name, target, help in COMMANDS:
+        cli.command(target, name=name, help=help)
+    for name, target, help in ESTIMATORS:
+        cli.command(target, name=name, help=help, group=GROUP)
+
+    ffmpeg = FFmpeg()
+    ffmpeg.cli_vcodecs(cli)
+    ffmpeg.cli_acodecs(cli)
+    cli(["--help"])
+
 def scene(*ctx: Annotated[str, Parameter(
     allow_leading_hyphen=True,
     show=False,
 )]) -> None:
+    # Optimization: Root help is common on short jobs, skip building a scene
+    if (ctx == ("--help",)):
+        return overview()
     from depthflow.scene import DepthScene
     scene = DepthScene()
     scene.cli.meta(ctx)
 
 def main() -> None:
     cli = App(help_flags=[])
+    cli.command("depthflow.batch:batch", name="batch", help_flags=["--help"])
+    cli.command("depthflow.bench:bench", name="bench", help_flags=["--help"])
+    cli.command("depthflow.estimators.remote:serve", name="serve-estimator", help_flags=["--help"])
     cli.default(scene)
     cli(sys.argv[1:])
 
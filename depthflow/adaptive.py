@@ -0,0 +1,146 @@
+import time
+from typing import Any, Optional
+
+from attrs import define, field
+from shaderflow.module import ShaderModule
+
+
+@define
+class DepthAdaptive(ShaderModule):
+    """Trades realtime quality for a frame time budget: lowers quality (then SSAA) while the camera
+    moves or frames miss the budget, and restores them once idle. Inactive when freewheeling, so
+    exports stay deterministic"""
+
+    name: str = "iDepthAdaptive"
+
+    budget: Optional[float] = None
+    """Target frames per second, the scene's when None"""
+
+    minimum: float = 10.0
+    """Lowest quality to drop to, in percent"""
+
+    motion: float = 0.5
+    """Fraction of the full quality allowed while the camera moves"""
+
+    ssaa: bool = False
+    """Also lower SSAA when quality alone can't meet the budget"""
+
+    floor: float = 0.5
+    """Lowest SSAA to drop to"""
+
+    settle: float = 0.25
+    """Seconds without motion to be considered idle"""
+
+    tolerance: float = 0.1
+    """Relative frame time above the budget that counts as a miss"""
+
+    smooth: float = 0.8
+    """Frame time exponential moving average weight of history"""
+
+    cooldown: float = 1.0
+    """Seconds between SSAA changes, each one recreates the render textures"""
+
+    # Full quality to restore when idle, last values applied to detect user changes
+    _quality: float = field(default=None, repr=False)
+    _fullssaa: float = field(default=None, repr=False)
+    _applied: tuple[float, float] = field(default=(None, None), repr=False)
+
+    _frametime: float = field(default=0.0, repr=False)
+    _previous: Any = field(default=None, repr=False)
+    _moved: float = field(default=0.0, repr=False)
+    _changed: float = field(default=0.0, repr=False)
+    _moving: bool = field(default=False, repr=False)
+    _drops: int = field(default=0, repr=False)
+
+    @property
+    def target(self) -> float:
+        """Frame time budget in seconds"""
+        return 1.0 / (self.budget or self.scene.fps)
+
+    @property
+    def metrics(self) -> dict[str, Any]:
+        """Current decisions of the controller and what drove them"""
+        return dict(
+            frametime=round(self._frametime*1000, 3),
+            budget=round(self.target*1000, 3),
+            moving=self._moving,
+            idle=(not self._moving) and self.idle,
+            quality=self.scene.quality,
+            full=self._quality,
+            ssaa=self.scene.ssaa,
+            drops=self._drops,
+        )
+
+    @property
+    def idle(self) -> bool:
+        return (time.perf_counter() - self._moved) > self.settle
+
+    def setup(self) -> None:
+        if (self.scene.freewheel):
+            self.restore()
+
+    def restore(self) -> None:
+        """Put back the full quality and SSAA"""
+        self.sync()
+        self.apply(quality=self._quality, ssaa=self._fullssaa)
+
+    def sync(self) -> None:
+        """Adopt values set outside the controller (cli, ui) as the full ones"""
+        if (self.scene.quality != self._applied[0]):
+            self._quality = self.scene.quality
+        if (self.scene.ssaa != self._applied[1]):
+            self._fullssaa = self.scene.ssaa
+
+    def apply(self, quality: float, ssaa: float) -> None:
+        if (quality != self.scene.quality):
+            self.scene.quality = quality
+        if (ssaa != self.scene.ssaa):
+            self.scene.ssaa = ssaa
+            self._changed = time.perf_counter()
+        self._applied = (self.scene.quality, self.scene.ssaa)
+
+    def update(self) -> None:
+        if (self.scene.freewheel):
+            return
+        self.sync()
+        now = time.perf_counter()
+
+        # Camera motion is any change of the parallax state
+        state = self.scene.state.model_dump()
+        self._moving = (state != self._previous)
+        if (self._moving):
+            self._moved = now
+        self._previous = state
+
+        if (self.scene.rdt > 0):
+            self._frametime = (self.smooth*self._frametime + (1 - self.smooth)*self.scene.rdt) \
+                if (self._frametime > 0) else self.scene.rdt
+
+        # Full quality once the image settles
+        if (self.idle):
+            if (self._applied != (self._quality, self._fullssaa)):
+                self.log_debug(f"Idle, restoring quality {self._quality:.0f}% and {self._fullssaa:.2f}x SSAA")
+            self.apply(quality=self._quality, ssaa=self._fullssaa)
+            return
+
+        quality = min(self.scene.quality, self._quality*self.motion)
+        ssaa = self.scene.ssaa
+
+        # Multiplicative decrease on misses, additive increase with headroom
+        if (self._frametime > self.target*(1 + self.tolerance)):
+            if (quality > self.minimum):
+                quality = max(self.minimum, quality*0.8)
+                self._drops += 1
+            elif (self.ssaa) and (ssaa > self.floor) and (now - self._changed > self.cooldown):
+                ssaa = max(self.floor, round(ssaa*0.75, 2))
+                self._drops += 1
+                self.log_debug(f"Missing {self.target*1000:.1f}ms budget, SSAA to {ssaa:.2f}x")
+        else:
+            quality = min(self._quality*self.motion, quality + 1.0)
+
+        self.apply(quality=min(self._quality, max(self.minimum, quality)), ssaa=ssaa)
+
+    def ui(self) -> None:
+        from imgui_bundle import imgui
+        for key, value in self.metrics.items():
+            imgui.text(f"{key}: {value}")
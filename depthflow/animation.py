@@ -0,0 +1,256 @@
+import functools
+import json
+import math
+from abc import ABC, abstractmethod
+from collections.abc import Callable
+from pathlib import Path
+from typing import Annotated, Any, Literal, Optional, Union, get_origin
+
+import numpy as np
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+
+from depthflow.state import DepthState
+
+EASINGS: dict[str, Callable[[np.ndarray], np.ndarray]] = {
+    "linear": (lambda t: t),
+    "step":   (lambda t: np.floor(t)),
+    "in":     (lambda t: t*t),
+    "out":    (lambda t: t*(2.0 - t)),
+    "smooth": (lambda t: t*t*(3.0 - 2.0*t)),
+    "sine":   (lambda t: 0.5 - 0.5*np.cos(np.pi*t)),
+    "atan":   (lambda t: np.arctan(2.0*t) / np.arctan(2.0)),
+}
+"""Easing curves from 0 to 1 over a keyframe segment, vectorized"""
+
+# ---------------------------------------------------------------------------- #
+
+class _Track(BaseModel, ABC):
+    model_config = ConfigDict(extra="forbid", use_attribute_docstrings=True)
+
+    target: str
+    """State field, dotted for sub-states and '.x' or '.y' on vectors, eg. 'offset.x', 'blur.intensity'"""
+
+    @field_validator("target")
+    @classmethod
+    def _resolve(cls, target: str) -> str:
+        """Fail on loading rather than on the first frame for targets not on DepthState"""
+        annotation = DepthState
+        for index, part in enumerate(parts := target.split(".")):
+            if isinstance(annotation, type) and issubclass(annotation, BaseModel) \
+                and (part in annotation.model_fields):
+                annotation = annotation.model_fields[part].annotation
+            elif (part in ("x", "y")) and (index == len(parts) - 1) and (get_origin(annotation) is tuple):
+                return target
+            else:
+                raise ValueError(f"Unknown target '{target}', no '{part}' field on the state")
+        if (get_origin(annotation) is tuple):
+            raise ValueError(f"Target '{target}' is a vector, animate its '.x' or '.y'")
+        if (annotation not in (float, int, bool)):
+            raise ValueError(f"Target '{target}' isn't a number on the state")
+        return target
+
+    @abstractmethod
+    def evaluate(self, tau: np.ndarray) -> np.ndarray:
+        """Values of the target at each normalized time"""
+        ...
+
+
+class Set(_Track):
+    """Constant value for the whole animation"""
+    type: Literal["set"] = "set"
+
+    value: float
+
+    def evaluate(self, tau: np.ndarray) -> np.ndarray:
+        return np.full_like(tau, self.value)
+
+
+class Wave(_Track):
+    """Periodic value, bias + amplitude*shape(frequency*cycle + phase)"""
+    type: Literal["wave"] = "wave"
+
+    amplitude: float = 1.0
+    """Peak deviation from the bias"""
+
+    frequency: float = 1.0
+    """Periods per loop of the animation, integers loop seamlessly"""
+
+    phase: float = 0.0
+    """Offset of the wave in radians"""
+
+    bias: float = 0.0
+    """Value at the center of the wave"""
+
+    shape: Literal["sin", "cos"] = "sin"
+
+    def evaluate(self, tau: np.ndarray) -> np.ndarray:
+        angle = (self.frequency * math.tau) * tau + self.phase
+        return self.bias + self.amplitude * getattr(np, self.shape)(angle)
+
+
+class Key(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    time: float = Field(ge=0.0, le=1.0)
+    """Normalized time of the keyframe, 0 to 1 over the animation"""
+
+    value: float
+
+    ease: Literal["linear", "step", "in", "out", "smooth", "sine", "atan"] = "linear"
+    """Curve from the previous keyframe to this one, see EASINGS"""
+
+
+class Keyframes(_Track):
+    """Interpolation between keyframes, holding the first and last values outside them"""
+    type: Literal["keyframes"] = "keyframes"
+
+    keys: list[Key] = Field(min_length=1)
+
+    def evaluate(self, tau: np.ndarray) -> np.ndarray:
+        keys   = sorted(self.keys, key=lambda key: key.time)
+        times  = np.array([key.time  for key in keys])
+        values = np.array([key.value for key in keys])
+
+        if (len(keys) == 1):
+            return np.full_like(tau, values[0])
+
+        # Segment of each time, normalized progress within it
+        end = np.clip(np.searchsorted(times, tau, side="right"), 1, len(keys) - 1)
+        span = np.maximum(times[end] - times[end - 1], 1e-9)
+        progress = np.clip((tau - times[end - 1]) / span, 0.0, 1.0)
+
+        for index in np.unique(end):
+            mask = (end == index)
+            progress[mask] = EASINGS[keys[index].ease](progress[mask])
+
+        return values[end - 1] + (values[end] - values[end - 1]) * progress
+
+
+Track = Annotated[Union[Set, Wave, Keyframes], Field(discriminator="type")]
+
+# ---------------------------------------------------------------------------- #
+
+class DepthAnimation(BaseModel):
+    """Declarative animation of DepthState fields, evaluated for all frames at once into a table of
+    one row per frame and one column per animated channel"""
+    model_config = ConfigDict(extra="forbid")
+
+    tracks: list[Track] = Field(default_factory=list)
+    """Value sources of each target, later tracks replace earlier ones on the same target"""
+
+    @property
+    def channels(self) -> list[str]:
+        return list(dict.fromkeys(track.target for track in self.tracks))
+
+    def evaluate(self, tau: np.ndarray) -> np.ndarray:
+        """Values of all channels at each normalized time, shape (len(tau), len(channels))"""
+        tau = np.asarray(tau, dtype=np.float64)
+        channels = {name: index for index, name in enumerate(self.channels)}
+        table = np.zeros((len(tau), len(channels)), dtype=np.float32)
+        for track in self.tracks:
+            table[:, channels[track.target]] = track.evaluate(tau)
+        return table
+
+    def table(self, fps: float, runtime: float) -> np.ndarray:
+        """Values of all channels for every frame of a loop"""
+        frames = max(1, round(fps * runtime))
+        return self.evaluate((np.arange(frames) / (fps * runtime)) % 1.0)
+
+    def apply(self, state: DepthState, row: np.ndarray) -> None:
+        """Assign a row of the table to the state, vector components are merged"""
+        vectors: dict[tuple[int, str], tuple[Any, list[float]]] = dict()
+
+        for target, value in zip(self.channels, row.tolist()):
+            *path, name = target.split(".")
+            owner = state
+
+            if (name in ("x", "y")) and path:
+                *path, field = path
+                for part in path:
+                    owner = getattr(owner, part)
+                _, vector = vectors.setdefault((id(owner), field), (owner, list(getattr(owner, field))))
+                vector["xy".index(name)] = value
+                continue
+
+            for part in path:
+                owner = getattr(owner, part)
+            setattr(owner, name, value)
+
+        for (_, field), (owner, vector) in vectors.items():
+            setattr(owner, field, tuple(vector))
+
+    @classmethod
+    def load(cls, spec: Optional[Union["DepthAnimation", dict, str, Path]]) -> Optional["DepthAnimation"]:
+        """From an instance, dict, built-in preset name, JSON file or inline JSON"""
+        if (spec is None) or isinstance(spec, DepthAnimation):
+            return spec
+        if isinstance(spec, dict):
+            spec = json.dumps(spec, sort_keys=True)
+        return _parse(str(spec))
+
+
+@functools.lru_cache(maxsize=64)
+def _parse(spec: str) -> DepthAnimation:
+    if (spec in PRESETS):
+        return PRESETS[spec]
+    if spec.lstrip().startswith("{"):
+        return DepthAnimation.model_validate_json(spec)
+    if (path := Path(spec)).suffix == ".json":
+        return DepthAnimation.model_validate_json(path.read_text())
+    raise ValueError(f"Unknown animation '{spec}', not a preset ({', '.join(PRESETS)}) or JSON")
+
+# ---------------------------------------------------------------------------- #
+
+def _smooth(start: float, end: float) -> Keyframes:
+    return Keyframes(target="height", keys=[
+        Key(time=0.0, value=start),
+        Key(time=1.0, value=start + (end - start)*math.atan(2.0)*(2.0/math.pi), ease="atan"),
+    ])
+
+PRESETS: dict[str, DepthAnimation] = {
+    "vertical": DepthAnimation(tracks=[
+        Set(target="isometric", value=0.60),
+        Set(target="steady", value=0.30),
+        Set(target="offset.x", value=0.0),
+        Wave(target="offset.y", amplitude=0.80),
+    ]),
+    "horizontal": DepthAnimation(tracks=[
+        Set(target="isometric", value=0.60),
+        Set(target="steady", value=0.30),
+        Wave(target="offset.x", amplitude=0.80),
+        Set(target="offset.y", value=0.0),
+    ]),
+    "circle": DepthAnimation(tracks=[
+        Set(target="isometric", value=0.60),
+        Set(target="steady", value=0.30),
+        Wave(target="offset.x", amplitude=0.50, phase=math.pi/2.0),
+        Wave(target="offset.y", amplitude=0.50),
+    ]),
+    "dolly": DepthAnimation(tracks=[
+        Set(target="height", value=0.30),
+        Set(target="steady", value=0.35),
+        Set(target="focus", value=0.35),
+        Set(target="zoom", value=0.95),
+        Wave(target="isometric", shape="cos", amplitude=-0.50, bias=0.50),
+    ]),
+    "orbital": DepthAnimation(tracks=[
+        Set(target="steady", value=0.30),
+        Set(target="focus", value=0.30),
+        Set(target="zoom", value=0.98),
+        Wave(target="isometric", shape="cos", amplitude=0.50, bias=0.75),
+        Wave(target="offset.x", amplitude=0.50),
+        Set(target="offset.y", value=0.0),
+    ]),
+    "zoom": DepthAnimation(tracks=[
+        Wave(target="height", shape="cos", amplitude=-0.40, bias=0.40),
+    ]),
+    "zoom-in": DepthAnimation(tracks=[
+        Keyframes(target="height", keys=[Key(time=0.0, value=0.0), Key(time=1.0, value=1.0)]),
+    ]),
+    "zoom-in-smooth": DepthAnimation(tracks=[_smooth(0.0, 1.0)]),
+    "zoom-out": DepthAnimation(tracks=[
+        Keyframes(target="height", keys=[Key(time=0.0, value=1.0), Key(time=1.0, value=0.0)]),
+    ]),
+    "zoom-out-smooth": DepthAnimation(tracks=[_smooth(1.0, 0.0)]),
+}
+"""Built-in animations, the classic presets"""
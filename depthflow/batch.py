@@ -0,0 +1,302 @@
+import contextlib
+import glob
+import importlib
+import importlib.util
+import itertools
+import json
+import multiprocessing
+import os
+import queue
+import time
+from pathlib import Path
+from typing import Annotated, Any, Optional
+
+from attrs import Factory, define
+from cyclopts import Parameter
+
+from depthflow import logger
+
+
+@define
+class DepthBatch:
+    """Shards rendering of many inputs, presets and states across headless scene processes,
+    recording finished outputs in a manifest so interrupted runs resume where they stopped"""
+
+    inputs: list[Path]
+    """Input images to render"""
+
+    output: Path
+    """Directory of the rendered videos"""
+
+    root: Optional[Path] = None
+    """Directory of the inputs, their relative paths are kept in the outputs (None for their common one)"""
+
+    presets: list[str] = Factory(lambda: ["depthflow.scene:DepthScene"])
+    """Scene classes as 'module:Class' or 'file.py:Class'"""
+
+    states: dict[str, dict] = Factory(lambda: dict(default=dict()))
+    """Named DepthState options to render each preset with"""
+
+    animations: dict[str, Optional[str]] = Factory(lambda: dict(default=None))
+    """Named animations as preset names, JSON files or inline JSON (None for the preset's own)"""
+
+    workers: int = 1
+    """Number of headless scene processes"""
+
+    format: str = "mp4"
+    """Container of the rendered videos"""
+
+    remote: bool = False
+    """Estimate in a shared `serve-estimator` daemon instead of a model per worker"""
+
+    options: dict[str, Any] = Factory(dict)
+    """Keyword arguments to every scene.main call"""
+
+    def __attrs_post_init__(self) -> None:
+        if (self.root is None) and (self.inputs):
+            self.root = Path(os.path.commonpath([path.absolute().parent for path in self.inputs]))
+
+    @property
+    def manifest(self) -> Path:
+        return (self.output/"manifest.jsonl")
+
+    @staticmethod
+    def preset(spec: str) -> type:
+        """Import a scene class from 'module:Class' or 'file.py:Class'"""
+        where, name = spec.rsplit(":", 1)
+        if where.endswith(".py"):
+            loader = importlib.util.spec_from_file_location(Path(where).stem, where)
+            module = importlib.util.module_from_spec(loader)
+            loader.loader.exec_module(module)
+        else:
+            module = importlib.import_module(where)
+        return getattr(module, name)
+
+    def path(self, input: Path, preset: str, animation: str, state: str) -> Path:
+        name = preset.rsplit(":", 1)[1].lower()
+        if (self.animations[animation] is not None):
+            name = f"{name}-{animation}"
+
+        # Same named inputs of different directories don't overwrite each other
+        try:
+            input = input.absolute().relative_to(self.root.absolute())
+        except (AttributeError, ValueError):
+            input = Path(input.name)
+        return (self.output/input.parent/f"{input.stem}-{name}-{state}.{self.format}")
+
+    def completed(self) -> set[str]:
+        """Outputs recorded in the manifest that still exist on disk"""
+        if not self.manifest.exists():
+            return set()
+        done = set()
+        for line in self.manifest.read_text().splitlines():
+            with contextlib.suppress(json.JSONDecodeError, KeyError):
+                done.add(json.loads(line)["output"])
+        return {output for output in done if Path(output).exists()}
+
+    def jobs(self) -> list[tuple[str, list[tuple[str, str, str, str]]]]:
+        """Pending (input, [(preset, animation, state, output), ...]), grouped by input to estimate once"""
+        done, jobs = self.completed(), list()
+        owners: dict[Path, Path] = dict()
+        for input in self.inputs:
+            variants = list()
+            for preset in self.presets:
+                for animation in self.animations:
+                    for state in self.states:
+                        output = self.path(input, preset, animation, state)
+                        if (owner := owners.setdefault(output, input)) != input:
+                            raise ValueError(f"Inputs {owner} and {input} would both render to {output}")
+                        if (str(output) not in done):
+                            variants.append((preset, animation, state, str(output)))
+            if (variants):
+                jobs.append((str(input), variants))
+        return jobs
+
+    def work(self, worker: int, jobs: multiprocessing.Queue, results: multiprocessing.Queue) -> None:
+        """Render jobs from the queue until a None sentinel, reporting each output"""
+        from depthflow.estimators.remote import DepthRemote
+        from depthflow.state import DepthState
+        from depthflow.variants import DepthVariant
+        scenes: dict[str, Any] = dict()
+        defaults: dict[str, Any] = dict()
+
+        def scene(preset: str) -> Any:
+            if (preset not in scenes):
+                scenes[preset] = self.preset(preset)(backend="headless")
+                defaults[preset] = scenes[preset].animation
+                if (self.remote):
+                    scenes[preset].estimator = DepthRemote()
+            return scenes[preset]
+
+        while (job := jobs.get()) is not None:
+            input, variants = job
+            try:
+                image, depth = scene(variants[0][0]).load(Path(input))
+            except Exception as error:
+                results.put(dict(worker=worker, input=input, error=repr(error)))
+                continue
+
+            # Variants of a preset share a single frame loop, each sets its animation
+            for preset in dict.fromkeys(preset for (preset, _, _, _) in variants):
+                group = [(animation, state, output)
+                    for (name, animation, state, output) in variants if (name == preset)]
+                start = time.perf_counter()
+                try:
+                    instance = scene(preset)
+                    instance.input(image=image, depth=depth)
+                    instance.variants([DepthVariant(
+                        output=Path(output),
+                        state=DepthState(**self.states[state]),
+                        options=dict(animation=(self.animations[animation] or defaults[preset])),
+                    ) for (animation, state, output) in group], **self.options)
+                except Exception as error:
+                    results.put(dict(worker=worker, input=input, error=repr(error)))
+                    continue
+                for animation, state, output in group:
+                    results.put(dict(
+                        worker=worker, input=input,
+                        preset=preset, animation=animation, state=state, output=output,
+                        seconds=round((time.perf_counter() - start)/len(group), 3),
+                    ))
+
+        results.put(dict(worker=worker, done=True))
+
+    def run(self) -> None:
+        self.output.mkdir(parents=True, exist_ok=True)
+
+        if not (jobs := self.jobs()):
+            logger.info(f"Nothing to render, all outputs are in {self.manifest}")
+            return None
+
+        for _, variants in jobs:
+            for *_, output in variants:
+                Path(output).parent.mkdir(parents=True, exist_ok=True)
+
+        total = sum(len(variants) for _, variants in jobs)
+        workers = max(1, min(self.workers, len(jobs)))
+        logger.info(f"Rendering {total} outputs of {len(jobs)} inputs on {workers} workers")
+
+        # Fresh interpreters, OpenGL contexts don't survive forking
+        context = multiprocessing.get_context("spawn")
+        pending = context.Queue()
+        results = context.Queue()
+        for job in jobs:
+            pending.put(job)
+        for _ in range(workers):
+            pending.put(None)
+
+        processes = [context.Process(target=self.work, args=(worker, pending, results), daemon=True)
+            for worker in range(workers)]
+        for process in processes:
+            process.start()
+
+        start = time.perf_counter()
+        counts = [0] * workers
+        running = set(range(workers))
+
+        with self.manifest.open("a") as manifest:
+            while (running):
+                try:
+                    result = results.get(timeout=1.0)
+                except queue.Empty:
+                    for worker in list(running):
+                        if not processes[worker].is_alive():
+                            logger.error(f"Worker {worker} died unexpectedly")
+                            running.discard(worker)
+                    continue
+
+                if result.get("done"):
+                    running.discard(result["worker"])
+                    continue
+
+                if (error := result.get("error")):
+                    logger.error(f"Worker {result['worker']} failed on {result['input']}: {error}")
+                    continue
+
+                manifest.write(json.dumps(result) + "\n")
+                manifest.flush()
+                counts[worker := result["worker"]] += 1
+                elapsed = (time.perf_counter() - start)
+                logger.info(
+                    f"Worker {worker} • {counts[worker]} outputs ({counts[worker]/elapsed*60:.1f}/min)"
+                    f" • {sum(counts)}/{total} total • {result['output']}"
+                )
+
+        for process in processes:
+            process.join()
+
+        elapsed = (time.perf_counter() - start)
+        for worker, count in enumerate(counts):
+            logger.info(f"Worker {worker} rendered {count} outputs, {count/elapsed*60:.1f}/min")
+        logger.info(f"Rendered {sum(counts)}/{total} outputs in {elapsed:.1f}s")
+
+
+def batch(
+    input: Annotated[str, Parameter(
+        help="Glob of input images, recursive with '**'",
+        name=("--input", "-i"))],
+    output: Annotated[Path, Parameter(
+        help="Directory of the rendered videos and manifest",
+        name=("--output", "-o"))],
+    preset: Annotated[Optional[list[str]], Parameter(
+        help="Scene classes to render as 'module:Class' or 'file.py:Class' (None for DepthScene)",
+        name=("--preset", "-p"))] = None,
+    animation: Annotated[Optional[list[str]], Parameter(
+        help="Animations as preset names, JSON files or inline JSON (None for the preset's own)",
+        name=("--animation", "-a"))] = None,
+    state: Annotated[Optional[list[str]], Parameter(
+        help="DepthState options as JSON files or inline JSON objects (None for default)",
+        name=("--state", "-s"))] = None,
+    workers: Annotated[int, Parameter(
+        help="Number of headless scene processes",
+        name=("--workers", "-n"))] = 1,
+    remote: Annotated[bool, Parameter(
+        help="Estimate in a shared `serve-estimator` daemon instead of a model per worker")] = False,
+    format: Annotated[str, Parameter(
+        help="Container of the rendered videos")] = "mp4",
+    time: Annotated[float, Parameter(
+        help="Duration of each video", name=("--time", "-t"))] = 5.0,
+    fps: Annotated[float, Parameter(
+        help="Frames per second of each video", name=("--fps", "-f"))] = 60.0,
+    width: Annotated[Optional[int], Parameter(
+        help="Width of the videos (None to find by aspect ratio)", name=("--width", "-w"))] = None,
+    height: Annotated[Optional[int], Parameter(
+        help="Height of the videos (None to find by aspect ratio)", name=("--height", "-h"))] = 1080,
+    ssaa: Annotated[float, Parameter(
+        help="Super sampling anti aliasing factor")] = 1.0,
+) -> None:
+    """Render many inputs with presets, animations and states across processes, resuming interrupted runs"""
+    from depthflow.animation import DepthAnimation
+
+    animations = dict()
+    for index, item in enumerate(animation or ()):
+        DepthAnimation.load(item) # Fail early on unknown or invalid ones
+        if (path := Path(item)).suffix == ".json":
+            animations[path.stem] = item
+        elif item.lstrip().startswith("{"):
+            animations[f"animation{index}"] = item
+        else:
+            animations[item] = item
+
+    states = dict()
+    for index, item in enumerate(state or ()):
+        if (path := Path(item)).suffix == ".json":
+            states[path.stem] = json.loads(path.read_text())
+        else:
+            states[f"state{index}"] = json.loads(item)
+
+    # Outputs mirror the inputs' directories under the glob's fixed part
+    root = Path(*itertools.takewhile(lambda part: not glob.has_magic(part), Path(input).parent.parts))
+
+    DepthBatch(
+        inputs=sorted(Path(path) for path in glob.glob(input, recursive=True)),
+        output=output,
+        root=(root if root.parts else None),
+        presets=(preset or ["depthflow.scene:DepthScene"]),
+        states=(states or dict(default=dict())),
+        animations=(animations or dict(default=None)),
+        workers=workers,
+        format=format,
+        remote=remote,
+        options=dict(time=time, fps=fps, width=width, height=height, ssaa=ssaa),
+    ).run()
@@ -0,0 +1,261 @@
+import json
+import os
+import platform
+import statistics
+import tempfile
+import time
+from collections.abc import Callable
+from pathlib import Path
+from typing import Annotated, Any, Optional
+
+from attrs import Factory, define
+from cyclopts import Parameter
+
+import depthflow
+from depthflow import logger
+
+EFFECTS: dict[str, dict] = {
+    "none":     dict(),
+    "vignette": dict(vignette=dict(intensity=0.30)),
+    "lens":     dict(lens=dict(intensity=0.30)),
+    "inpaint":  dict(inpaint=dict(limit=1.00)),
+    "color":    dict(color=dict(saturation=130, contrast=110, brightness=105, sepia=10)),
+    "blur":     dict(blur=dict(intensity=1.00)),
+}
+"""DepthState options enabling each post-effect alone"""
+
+
+def synthetic(width: int, height: int, seed: int=0) -> tuple[Any, Any]:
+    """Deterministic RGB uint8 image and float32 depthmap with smooth blobs and sharp edges"""
+    import numpy as np
+    random = np.random.default_rng(seed)
+    y, x = np.mgrid[0:1:height*1j, 0:1:width*1j].astype(np.float32)
+    depth = 0.5 + 0.25*np.sin(6*x + random.uniform(0, 6))*np.cos(4*y + random.uniform(0, 6))
+    for cx, cy, radius in random.uniform((0.1, 0.1, 0.05), (0.9, 0.9, 0.20), size=(6, 3)):
+        depth = np.where((x - cx)**2 + (y - cy)**2 < radius**2, depth + 0.2, depth)
+    image = np.stack((x, y, depth), axis=2) * 255 + random.normal(0, 8, (height, width, 3))
+    return (np.clip(image, 0, 255).astype(np.uint8), np.clip(depth, 0, 1).astype(np.float32))
+
+
+@define
+class DepthBench:
+    """Measures estimation, depthmap cache, headless rendering and encoding performance on
+    synthetic inputs, results are plain dicts for comparing releases and machines"""
+
+    estimators: list[str] = Factory(lambda: ["da1", "da2"])
+    """Estimators to measure, 'da1' or 'da2'"""
+
+    models: list[str] = Factory(lambda: ["small", "base", "large"])
+    """Model sizes to measure of each estimator"""
+
+    resolutions: list[tuple[int, int]] = Factory(lambda: [(640, 360), (1280, 720), (1920, 1080)])
+    """Rendering resolutions, effects are measured on the first"""
+
+    ssaa: list[float] = Factory(lambda: [1.0, 2.0])
+    """Super sampling factors of each resolution"""
+
+    qualities: list[float] = Factory(lambda: [0.0, 50.0, 100.0])
+    """Quality levels of each resolution"""
+
+    frames: int = 30
+    """Timed frames per rendering configuration, after a few warmup ones"""
+
+    repeat: int = 5
+    """Timed runs of latency measurements, the median is reported"""
+
+    batch: int = 4
+    """Images per estimation batch for throughput"""
+
+    encode: float = 2.0
+    """Seconds of video exported for encoding throughput"""
+
+    @staticmethod
+    def median(function: Callable, repeat: int) -> float:
+        """Median seconds of calling a function some times"""
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function()
+            times.append(time.perf_counter() - start)
+        return statistics.median(times)
+
+    def estimation(self) -> list[dict]:
+        """Cold (with loading) and warm latency, batched throughput, per estimator and model"""
+        from depthflow.estimators import MODELS
+        from depthflow.estimators.anything import DepthAnythingV1, DepthAnythingV2
+        classes = dict(da1=DepthAnythingV1, da2=DepthAnythingV2)
+        images = [synthetic(960, 540, seed)[0] for seed in range(max(self.batch, 2))]
+        results = []
+
+        for name in self.estimators:
+            for model in self.models:
+                result = dict(estimator=name, model=model)
+                estimator = classes[name](model=model)
+
+                # Raw model calls, the cache would turn repeats into hits
+                try:
+                    start = time.perf_counter()
+                    estimator.load_model()
+                    estimator._estimate_batch(images[:1])
+                    result["cold"] = (time.perf_counter() - start)
+                    result["warm"] = self.median(lambda: estimator._estimate_batch(images[1:2]), self.repeat)
+                    took = self.median(lambda: estimator._estimate_batch(images[:self.batch]), 1)
+                    result["throughput"] = (self.batch / took)
+                except Exception as error:
+                    logger.warn(f"Estimator {name} {model} failed: {error!r}")
+                    result["error"] = repr(error)
+                finally:
+                    estimator.unload()
+                    MODELS.unload(estimator.identity)
+
+                results.append(result)
+        return results
+
+    def caching(self) -> dict:
+        """Latencies of depthmap cache hits on each tier, with DEPTHMAPS settings on a scratch
+        directory, and of hashing an input image for its key"""
+        import numpy as np
+
+        from depthflow.estimators import DEPTHMAPS
+        from depthflow.estimators.anything import DepthAnythingV2
+        from depthflow.estimators.cache import DepthCache
+
+        image, depth = synthetic(1920, 1080)
+        depth = np.rint(depth * 65535).astype(np.uint16)
+        estimator = DepthAnythingV2()
+
+        with tempfile.TemporaryDirectory() as directory:
+            memory = DepthCache(directory=Path(directory), size=DEPTHMAPS.size,
+                limit=DEPTHMAPS.limit, level=DEPTHMAPS.level)
+            disk = DepthCache(directory=Path(directory), size=DEPTHMAPS.size,
+                limit=0, level=DEPTHMAPS.level)
+            result = dict(
+                key=self.median(lambda: estimator.key(image), self.repeat),
+                set=self.median(lambda: memory.set(1, depth), self.repeat),
+                memory=self.median(lambda: memory.get(1), self.repeat),
+                disk=self.median(lambda: disk.get(1), self.repeat),
+                bytes=len(memory.encode(depth)),
+            )
+            memory.disk.close()
+            disk.disk.close()
+        return result
+
+    def scene(self) -> Any:
+        """Headless scene with a synthetic input, moving camera"""
+        from depthflow.scene import DepthScene
+        scene = DepthScene(backend="headless", animation="circle")
+        image, depth = synthetic(1920, 1080)
+        scene.input(image=image, depth=depth)
+        return scene
+
+    def rendering(self, scene: Any) -> list[dict]:
+        """Headless frames per second across resolutions, SSAA and quality, then per effect"""
+        from depthflow.state import DepthState
+
+        # Initialize the window, programs and modules once
+        scene.main(width=self.resolutions[0][0], height=self.resolutions[0][1],
+            time=0.1, fps=60, freewheel=True)
+
+        configs = [dict(width=width, height=height, ssaa=ssaa, quality=quality, effect="none")
+            for (width, height) in self.resolutions for ssaa in self.ssaa for quality in self.qualities]
+        configs += [dict(width=self.resolutions[0][0], height=self.resolutions[0][1],
+            ssaa=self.ssaa[0], quality=50.0, effect=effect) for effect in EFFECTS if (effect != "none")]
+
+        results = []
+        for config in configs:
+            scene.state = DepthState.model_validate(EFFECTS[config["effect"]])
+            scene.resize(width=config["width"], height=config["height"])
+            scene.ssaa = config["ssaa"]
+            scene.quality = config["quality"]
+
+            # Warmup compiles variants and recreates textures
+            for _ in range(3):
+                scene.next(1/60)
+            scene.opengl.finish()
+
+            start = time.perf_counter()
+            for _ in range(self.frames):
+                scene.next(1/60)
+            scene.opengl.finish()
+            took = (time.perf_counter() - start)
+
+            results.append(dict(**config, fps=(self.frames/took), frametime=(took/self.frames)))
+            logger.info(f"Rendered {config} at {self.frames/took:.1f} fps")
+        return results
+
+    def encoding(self, scene: Any) -> list[dict]:
+        """Frames per second of whole exports per resolution, rendering and piping to FFmpeg"""
+        from depthflow.state import DepthState
+        scene.state = DepthState()
+        results = []
+
+        for (width, height) in self.resolutions:
+            result = dict(width=width, height=height, seconds=self.encode)
+            with tempfile.TemporaryDirectory() as directory:
+                try:
+                    start = time.perf_counter()
+                    scene.main(width=width, height=height, fps=60, time=self.encode,
+                        output=Path(directory)/"bench.mp4")
+                    took = (time.perf_counter() - start)
+                    result["fps"] = (round(self.encode*60) / took)
+                    result["realtime"] = (self.encode / took)
+                except Exception as error:
+                    logger.warn(f"Encoding {width}x{height} failed: {error!r}")
+                    result["error"] = repr(error)
+            results.append(result)
+        return results
+
+    def run(self) -> dict:
+        results = dict(
+            depthflow=depthflow.__version__,
+            python=platform.python_version(),
+            platform=platform.platform(),
+            processor=(platform.processor() or platform.machine()),
+            cpus=os.cpu_count(),
+        )
+        results["estimation"] = self.estimation()
+        results["cache"] = self.caching()
+        scene = self.scene()
+        results["render"] = self.rendering(scene)
+        results["renderer"] = scene.opengl.info.get("GL_RENDERER")
+        results["encode"] = self.encoding(scene)
+        return results
+
+
+def bench(
+    estimator: Annotated[Optional[list[str]], Parameter(
+        help="Estimators to measure, 'da1' or 'da2' (None for both, --empty-estimator to skip)",
+        name=("--estimator", "-e"))] = None,
+    model: Annotated[Optional[list[str]], Parameter(
+        help="Model sizes of each estimator (None for small, base and large)",
+        name=("--model", "-m"))] = None,
+    resolution: Annotated[Optional[list[str]], Parameter(
+        help="Rendering resolutions as WxH (None for 640x360, 1280x720 and 1920x1080)",
+        name=("--resolution", "-r"))] = None,
+    ssaa: Annotated[Optional[list[float]], Parameter(
+        help="Super sampling factors (None for 1 and 2)")] = None,
+    quality: Annotated[Optional[list[float]], Parameter(
+        help="Quality levels (None for 0, 50 and 100)",
+        name=("--quality", "-q"))] = None,
+    frames: Annotated[int, Parameter(
+        help="Timed frames per rendering configuration")] = 30,
+    encode: Annotated[float, Parameter(
+        help="Seconds of video exported per resolution for encoding throughput")] = 2.0,
+    output: Annotated[Optional[Path], Parameter(
+        help="Also write the JSON results to this file",
+        name=("--output", "-o"))] = None,
+) -> None:
+    """Measure estimation, cache, rendering and encoding performance, printed as JSON"""
+    options = dict(frames=frames, encode=encode)
+    for name, value in (("estimators", estimator), ("models", model),
+        ("ssaa", ssaa), ("qualities", quality)):
+        if (value is not None):
+            options[name] = value
+    if (resolution is not None):
+        options["resolutions"] = [tuple(map(int, item.lower().split("x"))) for item in resolution]
+
+    results = json.dumps(DepthBench(**options).run(), indent=2)
+    if (output is not None):
+        output.write_text(results)
+    print(results)
+
@@ -0,0 +1,23 @@
+COMMANDS: tuple[tuple[str, str, str], ...] = (
+    ("input",     "depthflow.scene:DepthScene.input",     "Use the given image and depthmap on the scene"),
+    ("video",     "depthflow.scene:DepthScene.stream",    "Use a video's frames and estimated depthmaps on the scene"),
+    ("variants",  "depthflow.scene:DepthScene._variants", "Render many variants of the input in one frame loop, eg. -v '{\"output\": \"a.mp4\", \"state\": {\"height\": 0.3}}'"),
+    ("adaptive",  "depthflow.scene:DepthScene.adapt",     "Lower quality in motion or on missed frames of realtime previews, full quality when idle"),
+    ("animation", "depthflow.scene:DepthScene.animate",   "Animate the state with a built-in preset or a JSON timeline of keyframes and waves"),
+    ("state",     "depthflow.state:DepthState",           "Parallax shader uniform values"),
+    ("fill",      "depthflow.inpaint:DepthFill",          "Inpainted background layer of an input, shown over steep gaps when inpainting"),
+    ("main",      "depthflow.scene:DepthScene.main",      "Main event loop of the scene"),
+)
+"""Commands of DepthScene as (name, lazy target, help), methods are bound to the scene and
+models passed to its smartset. Light to import, the root help lists them without a scene"""
+
+ESTIMATORS: tuple[tuple[str, str, str], ...] = (
+    ("da1",    "depthflow.estimators.anything:DepthAnythingV1", "Wrapper for https://github.com/LiheYoung/Depth-Anything"),
+    ("da2",    "depthflow.estimators.anything:DepthAnythingV2", "Wrapper for https://github.com/DepthAnything/Depth-Anything-V2"),
+    ("onnx",   "depthflow.estimators.onnx:DepthAnythingONNX",   "Depth Anything exported once to ONNX, ran with ONNX Runtime without torch"),
+    ("remote", "depthflow.estimators.remote:DepthRemote",       "Forwards estimation to a depthflow serve-estimator daemon, or runs in-process"),
+)
+"""Estimator commands, imported only when ran"""
+
+GROUP: str = "🌊 Depth Estimator"
+"""Help panel of the estimator commands"""
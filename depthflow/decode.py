@@ -0,0 +1,76 @@
+import math
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from typing import Any, Optional
+
+import numpy as np
+from PIL import Image, UnidentifiedImageError
+
+# Modes without a direct array layout, converted on decoding
+CONVERT: dict[str, str] = {
+    "1": "L", "P": "RGB", "PA": "RGBA", "CMYK": "RGB",
+    "YCbCr": "RGB", "LAB": "RGB", "HSV": "RGB",
+}
+
+
+def reducible(source: Any) -> bool:
+    """Whether a file's format decodes at a reduced size with `minimum`, reading only its header"""
+    try:
+        with Image.open(source) as image:
+            return (type(image).draft is not Image.Image.draft)
+    except (OSError, UnidentifiedImageError):
+        return False
+
+
+def decode(
+    source: Any,
+    minimum: Optional[int]=None,
+) -> np.ndarray:
+    """Decode an image from a Path, path or URL string, bytes, BytesIO or PIL Image to an array.
+    JPEGs are decoded at a reduced size with DCT scaling, yet with the shorter side no smaller
+    than `minimum`, if set"""
+    if isinstance(source, np.ndarray):
+        return source
+
+    if isinstance(source, Image.Image):
+        image = source
+    else:
+        if isinstance(source, bytes):
+            source = BytesIO(source)
+        elif isinstance(source, str) and ("://" in source):
+            import urllib.request
+            with urllib.request.urlopen(source) as response:
+                source = BytesIO(response.read())
+        try:
+            image = Image.open(source)
+        except UnidentifiedImageError:
+            if isinstance(source, BytesIO):
+                source.seek(0)
+            import imageio.v3 as imageio
+            return imageio.imread(source)
+
+    # Optimization: Decoders supporting it skip the full resolution
+    if (minimum is not None) and (min(image.size) > minimum):
+        scale = (minimum / min(image.size))
+        image.draft(image.mode, (math.ceil(image.width*scale), math.ceil(image.height*scale)))
+
+    if (image.mode == "P") and ("transparency" in image.info):
+        image = image.convert("RGBA")
+    elif (image.mode in CONVERT):
+        image = image.convert(CONVERT[image.mode])
+
+    return np.asarray(image)
+
+
+def decode_many(
+    sources: Iterable[Any],
+    minimum: Optional[int]=None,
+    threads: int=4,
+) -> list[np.ndarray]:
+    """Decode many images in parallel, in input order, decoders release the GIL"""
+    sources = list(sources)
+    if (len(sources) < 2) or (threads < 2):
+        return [decode(source, minimum=minimum) for source in sources]
+    with ThreadPoolExecutor(max_workers=threads, thread_name_prefix="DepthDecode") as pool:
+        return list(pool.map(lambda source: decode(source, minimum=minimum), sources))
@@ -1,52 +1,134 @@
+import itertools
+import mmap
 import os
 from abc import ABC, abstractmethod
+from collections.abc import Iterable
+from pathlib import Path
 from typing import Optional
 
 import numpy as np
 import xxhash
-from diskcache import Cache as DiskCache
 from numpy.typing import DTypeLike
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
 import depthflow
+from depthflow.estimators.cache import DepthCache
+from depthflow.estimators.pool import ModelPool
+from depthflow.estimators.post import DepthPost
 
-DEPTHMAPS: DiskCache = DiskCache(
+DEPTHMAPS: DepthCache = DepthCache(
     directory=depthflow.dirs.user_cache_path.joinpath("depthmaps"),
-    size_limit=int(os.getenv("DEPTHMAP_CACHE_SIZE_MB", 32))*(1024**2),
+    size=int(os.getenv("DEPTHMAP_CACHE_SIZE_MB", 32))*(1024**2),
+    limit=int(os.getenv("DEPTHMAP_MEMORY_SIZE_MB", 256))*(1024**2),
 )
 
+MODELS: ModelPool = ModelPool(
+    budget=int(os.getenv("DEPTHMAP_MODELS_SIZE_MB", 4096))*(1024**2),
+)
+
+_FILEHASHES: dict[tuple[str, int, int], int] = dict()
+"""Content hashes of files by their (path, size, mtime)"""
+
+def filehash(path: Path) -> int:
+    """Hash of a file's raw bytes, memoized while its size and mtime are unchanged"""
+    stat = (path := Path(path).resolve()).stat()
+    ident = (str(path), stat.st_size, stat.st_mtime_ns)
+
+    if (cached := _FILEHASHES.get(ident)) is not None:
+        return cached
+
+    hasher = xxhash.xxh3_64()
+    with open(path, "rb") as file:
+        if (stat.st_size > 0):
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                hasher.update(buffer)
+
+    _FILEHASHES[ident] = hasher.intdigest()
+    return _FILEHASHES[ident]
+
 class DepthEstimator(BaseModel, ABC):
+    model_config = ConfigDict(extra="forbid")
 
     @abstractmethod
     def __hash__(self) -> int:
         """Deterministic hash for current settings"""
         ...
 
-    def estimate(self, image: np.ndarray) -> np.ndarray:
+    def key(self, image: np.ndarray | Path) -> int:
+        """Cache key of an image or file for current settings"""
         hasher = xxhash.xxh3_64()
         hasher.update(str(self.__hash__()))
-        hasher.update(image.tobytes())
-        key: int = hasher.intdigest()
 
-        # Grab only rgb channels
-        if (image.shape[-1] == 4):
-            image = image[..., :3]
+        if isinstance(image, Path):
+            hasher.update(str(filehash(image)))
+            return hasher.intdigest()
+
+        # Zero-copy hashing of contiguous arrays
+        image = np.ascontiguousarray(image)
+        hasher.update(str((image.shape, image.dtype.str)))
+        hasher.update(memoryview(image).cast("B"))
+        return hasher.intdigest()
+
+    def estimate(self,
+        image: np.ndarray | Path,
+        *, key: Optional[int]=None,
+    ) -> np.ndarray:
+        return self.estimate_batch((image,), batch_size=1, keys=(key,))[0]
+
+    def estimate_batch(self,
+        images: Iterable[np.ndarray | Path],
+        batch_size: int=4,
+        *, keys: Optional[Iterable[Optional[int]]]=None,
+    ) -> list[np.ndarray]:
+        """Estimate many images at once, in input order. Files are only decoded on cache misses,
+        and known `keys`, if any, skips hashing the respective images"""
+        images = list(images)
+        keys   = [(key if (key is not None) else self.key(image))
+            for (image, key) in zip(images, keys or itertools.repeat(None))]
+
+        # Processed outputs are cached apart from the raw estimates
+        post   = self.postprocess()
+        depths = [DEPTHMAPS.get(post.key(key)) for key in keys]
+
+        # Unique cache misses, repeated images are processed once
+        misses: dict[int, int] = dict()
+        for index, (key, depth) in enumerate(zip(keys, depths)):
+            if (depth is None):
+                misses.setdefault(key, index)
+
+        raw = {key: DEPTHMAPS.get(key) for key in misses}
+        pending = [(key, index) for (key, index) in misses.items() if (raw[key] is None)]
 
         # Avoid expensive methods when cached
-        if (depth := DEPTHMAPS.get(key)) is None:
+        if (pending):
+            from depthflow.decode import decode_many
             self.load_model()
-            depth = self._estimate(image)
-            depth = self.normalize(depth)
-            DEPTHMAPS.set(key, depth)
+
+        for start in range(0, len(pending), (batch_size := max(1, batch_size))):
+            chunk = pending[start:start+batch_size]
+
+            # Grab only rgb channels, files decoded in parallel at the model's size
+            batch = decode_many((images[index] for (_, index) in chunk), minimum=self.resolution)
+            batch = [(image[..., :3] if (image.shape[-1] == 4) else image) for image in batch]
+
+            for (key, _), depth in zip(chunk, self._estimate_batch(batch)):
+                raw[key] = depth = self.normalize(depth, dtype=np.uint16)
+                DEPTHMAPS.set(key, depth)
+
+        processed: dict[int, np.ndarray] = dict()
+        for key in misses:
+            processed[key] = depth = post.quantize(post(raw[key]))
+            DEPTHMAPS.set(post.key(key), depth)
+
+        depths = [processed.get(key, depth) for (key, depth) in zip(keys, depths)]
 
         # Normalized f32 for GPU
-        depth = self.normalize(
-            array=depth,
-            dtype=np.float32,
-            min=0.0, max=1.0
-        )
+        return [post.dequantize(depth) for depth in depths]
 
-        return self._post(depth)
+    @property
+    def resolution(self) -> Optional[int]:
+        """Shorter side the model reads inputs at, files are decoded no smaller (None for full)"""
+        return None
 
     @abstractmethod
     def load_model(self) -> None:
@@ -57,9 +139,13 @@ class DepthEstimator(BaseModel, ABC):
         """Proper estimation logic"""
         ...
 
-    def _post(self, depth: np.ndarray) -> np.ndarray:
-        """Post-processing to mitigate artifacts"""
-        return depth
+    def _estimate_batch(self, images: list[np.ndarray]) -> list[np.ndarray]:
+        """Batched estimation logic, defaults to one at a time"""
+        return [self._estimate(image) for image in images]
+
+    def postprocess(self) -> DepthPost:
+        """Post-processing of the raw estimates, none by default"""
+        return DepthPost()
 
     @staticmethod
     def normalize(
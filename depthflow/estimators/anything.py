@@ -1,13 +1,31 @@
+import weakref
+from abc import abstractmethod
+from collections import defaultdict
 from enum import Enum
-from typing import Annotated, Any
+from typing import Annotated, Any, Optional
 
 import numpy as np
 import xxhash
 from cyclopts import Parameter
-from pydantic import PrivateAttr
+from pydantic import Field, PrivateAttr
 
 from depthflow import logger
-from depthflow.estimators import DepthEstimator
+from depthflow.estimators import MODELS, DepthEstimator
+from depthflow.estimators.post import DepthPost
+
+_OWNED: tuple[str, ...] = ("_processor", "_pipeline", "_loaded", "_release")
+"""Private attributes of a loaded model reference, never shared with copies"""
+
+# ---------------------------------------------------------------------------- #
+
+class AnythingPost(DepthPost):
+    """Post-processing defaults of Depth Anything V2, a fine smoothing of its sharper estimates"""
+    smooth: float = Field(default=0.6, ge=0.0)
+    dilate: int = Field(default=5, ge=1)
+
+class AnythingV1Post(AnythingPost):
+    """Post-processing defaults of Depth Anything V1"""
+    smooth: float = Field(default=0.3, ge=0.0)
 
 # ---------------------------------------------------------------------------- #
 
@@ -22,78 +40,257 @@ class DepthAnythingBase(DepthEstimator):
     model: Model = Model.Small
     """The model of DepthAnything to use"""
 
-    _processor: Annotated[
-        dict[Model, Any],
-        Parameter(show=False)
-    ] = PrivateAttr(default_factory=dict)
+    tile: int = Field(default=0, ge=0)
+    """Estimate in overlapping tiles of this size for high resolution details (0 to disable)"""
 
-    _pipelines: Annotated[
-        dict[Model, Any],
-        Parameter(show=False)
-    ] = PrivateAttr(default_factory=dict)
+    overlap: float = Field(default=0.25, ge=0.0, le=0.75)
+    """Overlap between neighboring tiles, relative to the tile size"""
+
+    post: AnythingPost = Field(default_factory=AnythingPost)
+    """Post-processing of the estimates, cached apart from the raw model outputs"""
+
+    _processor: Annotated[Any, Parameter(show=False)] = PrivateAttr(None)
+    _pipeline:  Annotated[Any, Parameter(show=False)] = PrivateAttr(None)
+    _loaded:    Annotated[Optional[tuple], Parameter(show=False)] = PrivateAttr(None)
+    _release:   Annotated[Any, Parameter(show=False)] = PrivateAttr(None)
 
     def __hash__(self) -> int:
         hasher = xxhash.xxh3_64()
         hasher.update(type(self).__name__)
         hasher.update(self.model.value)
+        if (self.tile):
+            hasher.update(f"{self.tile}:{self.overlap}")
         return hasher.intdigest()
 
-# ---------------------------------------------------------------------------- #
+    @property
+    @abstractmethod
+    def huggingface(self) -> str:
+        """Repository of the current model"""
+        ...
 
-class DepthAnythingV1(DepthAnythingBase):
-    """Wrapper for https://github.com/LiheYoung/Depth-Anything"""
+    @property
+    def identity(self) -> tuple:
+        """Key of the loaded model in the shared pool"""
+        return (type(self).__name__, self.model.value)
 
-    _model: Annotated[Any, Parameter(show=False)] = PrivateAttr(None)
+    def postprocess(self) -> DepthPost:
+        return self.post
+
+    @property
+    def resolution(self) -> Optional[int]:
+        # Processors fit the shorter side to 518, tiles need all details
+        return (None if self.tile else 518)
 
     def load_model(self) -> None:
-        if self.model not in self._pipelines:
-            import torch
-            from transformers import AutoImageProcessor, AutoModelForDepthEstimation
-            logger.info(f"Loading {type(self).__name__} {self.model}")
-            huggingface = f"LiheYoung/depth-anything-{self.model.value}-hf"
-            self._pipelines.setdefault(self.model, AutoModelForDepthEstimation.from_pretrained(huggingface))
-            self._processor.setdefault(self.model, AutoImageProcessor.from_pretrained(huggingface))
-            self._pipelines[self.model].to(torch.accelerator.current_accelerator() or "cpu")
+        if (self._loaded != (key := self.identity)):
+            self.unload()
+            self._pipeline, self._processor = MODELS.acquire(key, self._load)
+            self._loaded = key
+
+            # Release the reference when garbage collected, if not unloaded before
+            self._release = weakref.finalize(self, MODELS.release, key)
+
+    @abstractmethod
+    def _load(self) -> tuple[Any, Any]:
+        """Load the (pipeline, processor) of the current settings"""
+        ...
+
+    def unload(self) -> None:
+        """Release the current model back to the shared pool"""
+        if (self._release is not None):
+            self._release()
+        self._pipeline = self._processor = self._loaded = self._release = None
+
+    # Copies hold no reference, they acquire their own on loading
+
+    def __copy__(self) -> "DepthAnythingBase":
+        copy = super().__copy__()
+        copy.__pydantic_private__.update(dict.fromkeys(_OWNED))
+        return copy
+
+    def __deepcopy__(self, memo: Optional[dict]=None) -> "DepthAnythingBase":
+        memo = (memo if (memo is not None) else dict())
+        for name in _OWNED:
+            if (value := self.__pydantic_private__.get(name)) is not None:
+                memo[id(value)] = None
+        return super().__deepcopy__(memo)
 
     def _estimate(self, image: np.ndarray) -> np.ndarray:
-        import torch
-        with torch.no_grad():
-            image = self._processor[self.model](images=image, return_tensors="pt")
-            image.to(torch.accelerator.current_accelerator() or "cpu")
-            depth = self._pipelines[self.model](**image)
-            return depth.predicted_depth.cpu().numpy()[0]
-
-    def _post(self, depth: np.ndarray) -> np.ndarray:
-        from scipy.ndimage import gaussian_filter, maximum_filter
-        depth = gaussian_filter(input=depth, sigma=0.3)
-        depth = maximum_filter(input=depth, size=5)
-        return depth
+        return self._estimate_batch([image])[0]
+
+    def _estimate_batch(self, images: list[np.ndarray]) -> list[np.ndarray]:
+        if (not self.tile):
+            return self._forward(images)
+        return [self._tiled(image) for image in images]
+
+    @abstractmethod
+    def _forward(self, images: list[np.ndarray]) -> list[np.ndarray]:
+        """Raw model estimation of a batch of images"""
+        ...
+
+    def _tiled(self, image: np.ndarray, batch: int=4) -> np.ndarray:
+        """Estimate overlapping tiles aligned to a global estimate, blended at full resolution"""
+        from PIL import Image
+        height, width = image.shape[:2]
+
+        if (max(height, width) <= self.tile):
+            return self._forward([image])[0]
+
+        # Coarse estimate of the whole image, reference for tiles scale and shift
+        coarse = Image.fromarray(self._forward([image])[0].astype(np.float32))
+        scale = (coarse.width/width, coarse.height/height)
+
+        def starts(length: int) -> list[int]:
+            size = min(self.tile, length)
+            step = max(1, int(size * (1 - self.overlap)))
+            return sorted(set(range(0, length - size, step)) | {length - size})
+
+        boxes = [(x, y, min(x + self.tile, width), min(y + self.tile, height))
+            for y in starts(height) for x in starts(width)]
+
+        total  = np.zeros((height, width), dtype=np.float32)
+        weight = np.zeros((height, width), dtype=np.float32)
+        ramp   = max(1.0, self.tile * self.overlap / 2)
+
+        for start in range(0, len(boxes), batch):
+            chunk = boxes[start:start+batch]
+            crops = [image[y0:y1, x0:x1] for (x0, y0, x1, y1) in chunk]
+
+            for (x0, y0, x1, y1), depth in zip(chunk, self._forward(crops)):
+                size = (x1 - x0, y1 - y0)
+                depth = np.asarray(Image.fromarray(depth.astype(np.float32)).resize(
+                    size=size, resample=Image.Resampling.BILINEAR))
+                reference = np.asarray(coarse.resize(
+                    size=size, resample=Image.Resampling.BILINEAR,
+                    box=(x0*scale[0], y0*scale[1], x1*scale[0], y1*scale[1])))
+
+                # Least squares affine alignment, depth is relative per tile
+                A = np.stack((depth.ravel(), np.ones(depth.size, dtype=np.float32)), axis=1)
+                (a, b), *_ = np.linalg.lstsq(A, reference.ravel(), rcond=None)
+
+                # Linear ramps on the edges blends the seams
+                wx = np.minimum(np.arange(size[0]) + 0.5, size[0] - np.arange(size[0]) - 0.5)
+                wy = np.minimum(np.arange(size[1]) + 0.5, size[1] - np.arange(size[1]) - 0.5)
+                blend = np.outer(np.clip(wy/ramp, 0, 1), np.clip(wx/ramp, 0, 1)).astype(np.float32)
+
+                total[y0:y1, x0:x1]  += blend * (a*depth + b)
+                weight[y0:y1, x0:x1] += blend
+
+        return (total / weight)
 
 # ---------------------------------------------------------------------------- #
 
-class DepthAnythingV2(DepthAnythingBase):
-    """Wrapper for https://github.com/DepthAnything/Depth-Anything-V2"""
+class DepthAnythingTorch(DepthAnythingBase):
 
-    def load_model(self) -> None:
-        if self.model not in self._pipelines:
-            import torch
-            from transformers import AutoImageProcessor, AutoModelForDepthEstimation
-            logger.info(f"Loading {type(self).__name__} {self.model}")
-            huggingface = f"depth-anything/Depth-Anything-V2-{self.model.value}-hf"
-            self._pipelines.setdefault(self.model, AutoModelForDepthEstimation.from_pretrained(huggingface))
-            self._processor.setdefault(self.model, AutoImageProcessor.from_pretrained(huggingface))
-            self._pipelines[self.model].to(torch.accelerator.current_accelerator() or "cpu")
+    class Precision(str, Enum):
+        Fp32 = "fp32"
+        Bf16 = "bf16"
+        Fp16 = "fp16"
 
-    def _estimate(self, image: np.ndarray) -> np.ndarray:
+    precision: Precision = Precision.Fp32
+    """Autocast inference to this precision, bf16 is fast on recent CPUs"""
+
+    channels_last: bool = False
+    """Use channels last memory format for the model and inputs"""
+
+    compile: bool = False
+    """Compile the model with torch.compile, cached on disk across runs"""
+
+    threads: Optional[int] = Field(default=None, ge=1)
+    """Number of intra-op threads for inference (None for torch default)"""
+
+    interop: Optional[int] = Field(default=None, ge=1)
+    """Number of inter-op threads for inference, must be set before any (None for torch default)"""
+
+    def __hash__(self) -> int:
+        if (self.precision, self.channels_last, self.compile) == (self.Precision.Fp32, False, False):
+            return super().__hash__()
+        hasher = xxhash.xxh3_64()
+        hasher.update(str(super().__hash__()))
+        hasher.update(f"{self.precision.value}:{self.channels_last}:{self.compile}")
+        return hasher.intdigest()
+
+    @property
+    def identity(self) -> tuple:
+        return (*super().identity, self.channels_last, self.compile)
+
+    @property
+    def device(self) -> Any:
+        import torch
+        return torch.device(torch.accelerator.current_accelerator() or "cpu")
+
+    def _load(self) -> tuple[Any, Any]:
+        import torch
+        from transformers import AutoImageProcessor, AutoModelForDepthEstimation
+        logger.info(f"Loading {type(self).__name__} {self.model}")
+        pipeline = AutoModelForDepthEstimation.from_pretrained(self.huggingface).eval()
+        processor = AutoImageProcessor.from_pretrained(self.huggingface)
+        pipeline.to(self.device)
+        if (self.channels_last):
+            pipeline.to(memory_format=torch.channels_last)
+        if (self.compile):
+            pipeline = torch.compile(pipeline)
+        return (pipeline, processor)
+
+    def _threads(self) -> None:
+        import torch
+        if (self.threads):
+            torch.set_num_threads(self.threads)
+        if (self.interop) and (torch.get_num_interop_threads() != self.interop):
+            try:
+                torch.set_num_interop_threads(self.interop)
+            except RuntimeError:
+                logger.warn("Inter-op threads can only be set before any parallel work")
+
+    def _forward(self, images: list[np.ndarray]) -> list[np.ndarray]:
         import torch
-        with torch.no_grad():
-            image = self._processor[self.model](images=image, return_tensors="pt")
-            image.to(torch.accelerator.current_accelerator() or "cpu")
-            depth = self._pipelines[self.model](**image)
-            return depth.predicted_depth.cpu().numpy()[0]
-
-    def _post(self, depth: np.ndarray) -> np.ndarray:
-        from scipy.ndimage import gaussian_filter, maximum_filter
-        depth = gaussian_filter(input=depth, sigma=0.6)
-        depth = maximum_filter(input=depth, size=5)
-        return depth
+        self._threads()
+
+        # Aspect ratio is kept on resizing, bucket same sized inputs
+        inputs = [self._processor(images=image, return_tensors="pt")["pixel_values"] for image in images]
+        buckets: dict[tuple, list[int]] = defaultdict(list)
+        depths: list[np.ndarray] = [None] * len(images)
+
+        for index, tensor in enumerate(inputs):
+            buckets[tuple(tensor.shape)].append(index)
+
+        autocast = torch.autocast(
+            device_type=self.device.type,
+            dtype=dict(
+                fp32=torch.float32,
+                bf16=torch.bfloat16,
+                fp16=torch.float16,
+            )[self.precision.value],
+            enabled=(self.precision != self.Precision.Fp32),
+        )
+
+        with torch.inference_mode(), autocast:
+            for indices in buckets.values():
+                batch = torch.cat([inputs[index] for index in indices]).to(self.device)
+                if (self.channels_last):
+                    batch = batch.contiguous(memory_format=torch.channels_last)
+                output = self._pipeline(pixel_values=batch).predicted_depth.float().cpu().numpy()
+                for index, depth in zip(indices, output):
+                    depths[index] = depth
+
+        return depths
+
+# ---------------------------------------------------------------------------- #
+
+class DepthAnythingV1(DepthAnythingTorch):
+    """Wrapper for https://github.com/LiheYoung/Depth-Anything"""
+
+    @property
+    def huggingface(self) -> str:
+        return f"LiheYoung/depth-anything-{self.model.value}-hf"
+
+    post: AnythingV1Post = Field(default_factory=AnythingV1Post)
+
+# ---------------------------------------------------------------------------- #
+
+class DepthAnythingV2(DepthAnythingTorch):
+    """Wrapper for https://github.com/DepthAnything/Depth-Anything-V2"""
+
+    @property
+    def huggingface(self) -> str:
+        return f"depth-anything/Depth-Anything-V2-{self.model.value}-hf"
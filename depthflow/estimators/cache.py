@@ -0,0 +1,131 @@
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Optional
+
+import numpy as np
+from attrs import Factory, define
+
+
+@define
+class DepthCache:
+    """Two-tier depthmaps cache, a bytes-bounded in-memory LRU in front of a DiskCache, opened
+    on first use so importing estimators stays cheap"""
+
+    directory: Path
+    """Persistent storage of compressed depthmaps"""
+
+    size: int = 32*(1024**2)
+    """Maximum bytes of the persistent storage"""
+
+    limit: int = 256*(1024**2)
+    """Maximum bytes of decoded depthmaps kept in memory"""
+
+    level: int = 3
+    """Zlib compression level of the disk storage"""
+
+    hits: int = 0
+    """Number of lookups found in either tier"""
+
+    misses: int = 0
+    """Number of lookups not found in any tier"""
+
+    evictions: int = 0
+    """Number of depthmaps dropped from memory to fit the limit"""
+
+    _memory: OrderedDict[int, np.ndarray] = Factory(OrderedDict)
+    _lock: threading.Lock = Factory(threading.Lock)
+    _bytes: int = 0
+    _disk: Optional[Any] = None
+
+    @property
+    def disk(self) -> Any:
+        """The persistent DiskCache, opened on first access"""
+        if (self._disk is None):
+            with self._lock:
+                if (self._disk is None):
+                    from diskcache import Cache as DiskCache
+                    self._disk = DiskCache(directory=self.directory, size_limit=self.size)
+        return self._disk
+
+    # ------------------------------------------------------------------------ #
+
+    def encode(self, depth: np.ndarray) -> bytes:
+        """Header of (ndim, *shape), then byte-shuffled zlib of uint16 data. The high bit of
+        ndim marks uint8 data, for colors cached alongside depthmaps"""
+        if (depth.dtype not in (np.uint16, np.uint8)):
+            raise TypeError(f"Only uint16 depthmaps or uint8 colors can be cached, got {depth.dtype}")
+
+        # Split high and low bytes planes, smooth data compresses better
+        size = depth.dtype.itemsize
+        planes = np.ascontiguousarray(depth, dtype=f"<u{size}").view(np.uint8).reshape(-1, size).T
+        header = struct.pack(f"<B{depth.ndim}I", depth.ndim | (0x80 * (size == 1)), *depth.shape)
+        return header + zlib.compress(np.ascontiguousarray(planes), level=self.level)
+
+    @staticmethod
+    def decode(data: bytes) -> np.ndarray:
+        ndim  = (data[0] & 0x7F)
+        size  = (1 if (data[0] & 0x80) else 2)
+        shape = struct.unpack_from(f"<{ndim}I", data, offset=1)
+        planes = np.frombuffer(zlib.decompress(memoryview(data)[1 + 4*ndim:]), dtype=np.uint8)
+        return np.ascontiguousarray(planes.reshape(size, -1).T).view(f"<u{size}").reshape(shape)
+
+    # ------------------------------------------------------------------------ #
+
+    def _remember(self, key: int, depth: np.ndarray) -> None:
+        """Insert on the memory tier, evicting least recently used entries"""
+        if (depth.nbytes > self.limit):
+            return
+        depth.flags.writeable = False
+        if (old := self._memory.pop(key, None)) is not None:
+            self._bytes -= old.nbytes
+        self._memory[key] = depth
+        self._bytes += depth.nbytes
+        while (self._bytes > self.limit):
+            _, old = self._memory.popitem(last=False)
+            self._bytes -= old.nbytes
+            self.evictions += 1
+
+    def get(self, key: int) -> Optional[np.ndarray]:
+        with self._lock:
+            if (depth := self._memory.get(key)) is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return depth
+
+        # Previous formats are treated as misses and overwritten
+        if not isinstance(data := self.disk.get(key), bytes):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        depth = self.decode(data)
+
+        with self._lock:
+            self._remember(key, depth)
+            self.hits += 1
+        return depth
+
+    def set(self, key: int, depth: np.ndarray) -> None:
+        self.disk.set(key, self.encode(depth))
+        with self._lock:
+            self._remember(key, depth)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            self._bytes = 0
+        self.disk.clear()
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return dict(
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+            memory=self._bytes,
+            entries=len(self._memory),
+            disk=self.disk.volume(),
+        )
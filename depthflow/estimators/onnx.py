@@ -0,0 +1,151 @@
+import json
+from collections import defaultdict
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import xxhash
+from pydantic import Field
+
+import depthflow
+from depthflow import logger
+from depthflow.estimators.anything import AnythingV1Post, DepthAnythingBase
+from depthflow.estimators.post import DepthPost
+
+# ---------------------------------------------------------------------------- #
+
+class DepthAnythingONNX(DepthAnythingBase):
+    """Depth Anything exported once to ONNX, ran with ONNX Runtime without torch"""
+
+    major: int = Field(default=2, ge=1, le=2)
+    """Major version of Depth Anything to use"""
+
+    quantize: bool = Field(default=False)
+    """Use int8 dynamic quantization of weights, faster on CPU at a small precision cost"""
+
+    def __hash__(self) -> int:
+        hasher = xxhash.xxh3_64()
+        hasher.update(str(super().__hash__()))
+        hasher.update(f"{self.major}:{self.quantize}")
+        return hasher.intdigest()
+
+    @property
+    def huggingface(self) -> str:
+        if (self.major == 1):
+            return f"LiheYoung/depth-anything-{self.model.value}-hf"
+        return f"depth-anything/Depth-Anything-V2-{self.model.value}-hf"
+
+    @property
+    def identity(self) -> tuple:
+        return (*super().identity, self.major, self.quantize)
+
+    @property
+    def path(self) -> Path:
+        """Cached graph of the current settings"""
+        name = self.huggingface.replace("/", "--") + ("-int8"*self.quantize)
+        return depthflow.dirs.user_cache_path/"onnx"/f"{name}.onnx"
+
+    def export(self) -> Path:
+        """Export the huggingface model to ONNX and its preprocessing config, once"""
+        base = self.path.with_name(self.huggingface.replace("/", "--") + ".onnx")
+
+        if not base.exists():
+            import torch
+            from transformers import AutoImageProcessor, AutoModelForDepthEstimation
+            logger.info(f"Exporting {self.huggingface} to ONNX at {base}")
+            base.parent.mkdir(parents=True, exist_ok=True)
+
+            class Wrapper(torch.nn.Module):
+                def __init__(self, model: torch.nn.Module):
+                    super().__init__()
+                    self.model = model
+                def forward(self, pixel_values: torch.Tensor) -> torch.Tensor:
+                    return self.model(pixel_values=pixel_values).predicted_depth
+
+            model = AutoModelForDepthEstimation.from_pretrained(self.huggingface).eval()
+            processor = AutoImageProcessor.from_pretrained(self.huggingface)
+
+            with torch.inference_mode():
+                torch.onnx.export(
+                    Wrapper(model),
+                    (torch.zeros(1, 3, 518, 518),),
+                    str(base),
+                    input_names=["pixel_values"],
+                    output_names=["predicted_depth"],
+                    dynamic_axes=dict(
+                        pixel_values={0: "batch", 2: "height", 3: "width"},
+                        predicted_depth={0: "batch", 1: "height", 2: "width"},
+                    ),
+                    opset_version=17,
+                )
+
+            base.with_suffix(".json").write_text(json.dumps(dict(
+                size=(processor.size["height"], processor.size["width"]),
+                multiple=processor.ensure_multiple_of,
+                mean=processor.image_mean,
+                std=processor.image_std,
+            )))
+
+        if self.quantize and not self.path.exists():
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+            logger.info(f"Quantizing {base} to int8 at {self.path}")
+            quantize_dynamic(str(base), str(self.path), weight_type=QuantType.QInt8)
+
+        return self.path
+
+    def _load(self) -> tuple[Any, Any]:
+        import onnxruntime
+        logger.info(f"Loading {type(self).__name__} {self.model} (v{self.major})")
+        path = self.export()
+        config = json.loads(path.with_name(self.huggingface.replace("/", "--") + ".json").read_text())
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        session = onnxruntime.InferenceSession(
+            str(path), sess_options=options,
+            providers=onnxruntime.get_available_providers(),
+        )
+        return (session, config)
+
+    def _preprocess(self, image: np.ndarray) -> np.ndarray:
+        """NumPy port of the DPT image processor used by Depth Anything"""
+        from PIL import Image
+        config = self._processor
+        height, width = image.shape[:2]
+
+        # Resize as little as possible to fit the target size, keeping aspect ratio
+        scale_h, scale_w = (config["size"][0]/height, config["size"][1]/width)
+        if abs(1 - scale_w) < abs(1 - scale_h):
+            scale_h = scale_w
+        else:
+            scale_w = scale_h
+
+        def multiple(value: float) -> int:
+            return max(config["multiple"], round(value/config["multiple"]) * config["multiple"])
+
+        size = (multiple(width*scale_w), multiple(height*scale_h))
+        image = np.asarray(Image.fromarray(image).resize(size, resample=Image.Resampling.BICUBIC))
+        image = (image.astype(np.float32)/255 - np.float32(config["mean"])) / np.float32(config["std"])
+        return image.transpose(2, 0, 1)[None]
+
+    def _forward(self, images: list[np.ndarray]) -> list[np.ndarray]:
+
+        # Aspect ratio is kept on resizing, bucket same sized inputs
+        inputs = [self._preprocess(image) for image in images]
+        buckets: dict[tuple, list[int]] = defaultdict(list)
+        depths: list[np.ndarray] = [None] * len(images)
+
+        for index, array in enumerate(inputs):
+            buckets[array.shape].append(index)
+
+        for indices in buckets.values():
+            batch = np.concatenate([inputs[index] for index in indices])
+            (output,) = self._pipeline.run(["predicted_depth"], dict(pixel_values=batch))
+            for index, depth in zip(indices, output):
+                depths[index] = depth
+
+        return depths
+
+    def postprocess(self) -> DepthPost:
+        if (self.major == 1):
+            return AnythingV1Post(**self.post.model_dump(include=self.post.model_fields_set))
+        return self.post
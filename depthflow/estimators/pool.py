@@ -0,0 +1,80 @@
+import gc
+import itertools
+import threading
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from typing import Any
+
+from attrs import Factory, define
+
+from depthflow import logger
+
+
+@define
+class ModelPool:
+    """Process-wide registry of loaded models shared across estimator instances"""
+
+    @define
+    class Entry:
+        value: Any
+        size: int
+        refs: int = 0
+
+    budget: int = 0
+    """Maximum bytes of loaded models, only unreferenced ones are unloaded (0 for unlimited)"""
+
+    _entries: OrderedDict[Hashable, Entry] = Factory(OrderedDict)
+    _lock: threading.RLock = Factory(threading.RLock)
+
+    @staticmethod
+    def sizeof(value: Any) -> int:
+        """Bytes of torch parameters and buffers of a value or collection of them"""
+        if isinstance(value, (tuple, list)):
+            return sum(map(ModelPool.sizeof, value))
+        if hasattr(value, "parameters") and hasattr(value, "buffers"):
+            return sum(tensor.numel() * tensor.element_size()
+                for tensor in itertools.chain(value.parameters(), value.buffers()))
+        return 0
+
+    @property
+    def size(self) -> int:
+        return sum(entry.size for entry in self._entries.values())
+
+    def acquire(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """Get a loaded value or load it, holding a reference until released"""
+        with self._lock:
+            if (entry := self._entries.get(key)) is None:
+                value = loader()
+                entry = self._entries[key] = ModelPool.Entry(
+                    value=value, size=self.sizeof(value))
+            self._entries.move_to_end(key)
+            entry.refs += 1
+            self._trim()
+            return entry.value
+
+    def release(self, key: Hashable) -> None:
+        """Drop a reference, the value may be unloaded when over budget"""
+        with self._lock:
+            if (entry := self._entries.get(key)) is None:
+                return
+            entry.refs = max(0, entry.refs - 1)
+            self._trim()
+
+    def unload(self, key: Hashable=None) -> None:
+        """Forget a key or all of them, memory is freed once holders release it"""
+        with self._lock:
+            for other in list(self._entries):
+                if (key is None) or (key == other):
+                    logger.info(f"Unloading model {other}")
+                    del self._entries[other]
+        gc.collect()
+
+    def _trim(self) -> None:
+        """Unload least recently used unreferenced models while over budget"""
+        if (not self.budget):
+            return
+        for key in list(self._entries):
+            if (self.size <= self.budget):
+                break
+            if (self._entries[key].refs == 0):
+                self.unload(key)
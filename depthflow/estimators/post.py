@@ -0,0 +1,133 @@
+import sys
+from typing import Any, Optional
+
+import numpy as np
+import xxhash
+from pydantic import BaseModel, ConfigDict, Field
+
+
+class DepthPost(BaseModel):
+    """Post-processing of raw estimates to mitigate projection artifacts, ran on the torch device
+    when one is already loaded, vectorized NumPy in-place otherwise. Outputs float32 in 0..1"""
+    model_config = ConfigDict(extra="forbid")
+
+    scale: float = Field(default=1.0, gt=0.0)
+    """Resize the raw estimate by this factor before filtering"""
+
+    smooth: float = Field(default=0.0, ge=0.0)
+    """Gaussian blur sigma in pixels, softens noise and blocky upscaling (0 to disable)"""
+
+    dilate: int = Field(default=1, ge=1)
+    """Size of the maximum filter, fattens foreground edges for less stretching (1 to disable)"""
+
+    def __hash__(self) -> int:
+        hasher = xxhash.xxh3_64()
+        hasher.update(f"{self.scale}:{self.smooth}:{self.dilate}")
+        return hasher.intdigest()
+
+    def key(self, key: int) -> int:
+        """Cache key of the processed output of a raw depthmap key"""
+        hasher = xxhash.xxh3_64()
+        hasher.update(f"{key}:post:{self.__hash__()}")
+        return hasher.intdigest()
+
+    @property
+    def radius(self) -> int:
+        """Gaussian kernel radius, same truncation as scipy's"""
+        return int(4.0 * self.smooth + 0.5)
+
+    def kernel(self) -> np.ndarray:
+        x = np.arange(-self.radius, self.radius + 1, dtype=np.float64)
+        kernel = np.exp(-0.5 * (x / self.smooth)**2)
+        return (kernel / kernel.sum()).astype(np.float32)
+
+    @staticmethod
+    def device() -> Optional[Any]:
+        """An accelerator torch device, only if torch was already imported by an estimator"""
+        if (torch := sys.modules.get("torch")) is None:
+            return None
+        if (device := torch.accelerator.current_accelerator()) is None:
+            return None
+        return device
+
+    def __call__(self, depth: np.ndarray) -> np.ndarray:
+        if (device := self.device()) is not None:
+            return self._torch(depth, device)
+        return self._numpy(depth)
+
+    # Processing
+
+    def _resize(self, depth: np.ndarray) -> np.ndarray:
+        if (self.scale == 1.0):
+            return depth
+        from PIL import Image
+        height, width = depth.shape
+        return np.asarray(Image.fromarray(depth.astype(np.float32)).resize(
+            size=(max(1, round(width*self.scale)), max(1, round(height*self.scale))),
+            resample=Image.Resampling.BILINEAR,
+        ))
+
+    def _numpy(self, depth: np.ndarray) -> np.ndarray:
+        depth = np.array(self._resize(depth), dtype=np.float32)
+
+        # Single f32 pass normalization
+        lo, hi = depth.min(), depth.max()
+        depth -= lo
+        depth *= (1.0/(hi - lo) if (hi > lo) else 0.0)
+
+        if (self.smooth <= 0) and (self.dilate <= 1):
+            return depth
+
+        from scipy.ndimage import correlate1d, maximum_filter
+        scratch = np.empty_like(depth)
+
+        if (self.smooth > 0):
+            kernel = self.kernel()
+            correlate1d(depth, kernel, axis=0, output=scratch, mode="reflect")
+            correlate1d(scratch, kernel, axis=1, output=depth, mode="reflect")
+
+        if (self.dilate > 1):
+            maximum_filter(depth, size=self.dilate, output=scratch, mode="reflect")
+            depth, scratch = scratch, depth
+
+        return depth
+
+    def _torch(self, depth: np.ndarray, device: Any) -> np.ndarray:
+        import torch
+
+        def pad(x: torch.Tensor, before: int, after: int) -> torch.Tensor:
+            """Edge-inclusive reflection on the last two axes, as scipy's 'reflect'"""
+            for dim in (-1, -2):
+                n = x.shape[dim]
+                x = torch.cat((
+                    x.narrow(dim, 0, min(before, n)).flip(dim), x,
+                    x.narrow(dim, n - min(after, n), min(after, n)).flip(dim)
+                ), dim=dim)
+            return x
+
+        with torch.inference_mode():
+            tensor = torch.as_tensor(self._resize(depth), device=device, dtype=torch.float32)[None, None]
+            tensor = (tensor - tensor.min()) / (tensor.max() - tensor.min()).clamp_min(1e-12)
+
+            if (self.smooth > 0):
+                kernel = torch.as_tensor(self.kernel(), device=device)
+                tensor = pad(tensor, self.radius, self.radius)
+                tensor = torch.nn.functional.conv2d(tensor, kernel.view(1, 1, -1, 1))
+                tensor = torch.nn.functional.conv2d(tensor, kernel.view(1, 1, 1, -1))
+
+            if (self.dilate > 1):
+                tensor = pad(tensor, self.dilate//2, (self.dilate - 1)//2)
+                tensor = torch.nn.functional.max_pool2d(tensor, self.dilate, stride=1)
+
+            return tensor[0, 0].cpu().numpy()
+
+    # Storage
+
+    @staticmethod
+    def quantize(depth: np.ndarray) -> np.ndarray:
+        """Processed 0..1 depthmap to uint16, without renormalizing"""
+        return np.rint(np.clip(depth, 0.0, 1.0) * 65535.0).astype(np.uint16)
+
+    @staticmethod
+    def dequantize(depth: np.ndarray) -> np.ndarray:
+        return depth.astype(np.float32) * np.float32(1/65535)
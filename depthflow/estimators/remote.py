@@ -0,0 +1,273 @@
+import contextlib
+import json
+import queue
+import socket
+import socketserver
+import struct
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Annotated, Any, Literal, Optional
+
+import numpy as np
+from attrs import Factory, define, field
+from cyclopts import Parameter
+from pydantic import Field, PrivateAttr, SerializeAsAny, model_validator
+
+import depthflow
+from depthflow import logger
+from depthflow.estimators import DepthEstimator
+from depthflow.estimators.anything import DepthAnythingV1, DepthAnythingV2
+from depthflow.estimators.onnx import DepthAnythingONNX
+from depthflow.estimators.post import DepthPost
+
+SOCKET: Path = depthflow.dirs.user_runtime_path/"estimator.sock"
+"""Default path of the estimator daemon socket"""
+
+ESTIMATORS: dict[str, type[DepthEstimator]] = {
+    cls.__name__: cls for cls in (DepthAnythingV1, DepthAnythingV2, DepthAnythingONNX)
+}
+
+KINDS: dict[str, type[DepthEstimator]] = dict(
+    da1=DepthAnythingV1, da2=DepthAnythingV2, onnx=DepthAnythingONNX,
+)
+"""Estimators a remote can wrap, by their command names"""
+
+# ---------------------------------------------------------------------------- #
+# Messages are a u32 header length, a json header, then its raw payload bytes
+
+def _exactly(sock: socket.socket, size: int) -> bytearray:
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    while (view):
+        if not (length := sock.recv_into(view)):
+            raise ConnectionError("Socket closed mid message")
+        view = view[length:]
+    return buffer
+
+def send(sock: socket.socket, header: dict, arrays: list[np.ndarray]=()) -> None:
+    arrays = [np.ascontiguousarray(array) for array in arrays]
+    header = json.dumps(dict(header, arrays=[(array.shape, array.dtype.str) for array in arrays]))
+    sock.sendall(struct.pack("<I", len(header := header.encode())) + header)
+    for array in arrays:
+        sock.sendall(memoryview(array).cast("B"))
+
+def recv(sock: socket.socket) -> tuple[dict, list[np.ndarray]]:
+    (length,) = struct.unpack("<I", _exactly(sock, 4))
+    header = json.loads(_exactly(sock, length))
+    arrays = list()
+    for (shape, dtype) in header.pop("arrays"):
+        size = (int(np.prod(shape)) * np.dtype(dtype).itemsize)
+        arrays.append(np.frombuffer(_exactly(sock, size), dtype=dtype).reshape(shape))
+    return (header, arrays)
+
+# ---------------------------------------------------------------------------- #
+
+@define
+class DepthServer:
+    """Keeps estimators loaded and answers raw estimations over a unix socket"""
+
+    @define
+    class Job:
+        estimator: DepthEstimator
+        images: list[np.ndarray]
+        future: Future = Factory(Future)
+
+    socket: Path = field(default=SOCKET, converter=Path)
+    """Unix socket path to listen on"""
+
+    batch: int = 8
+    """Maximum images forwarded through the model at once"""
+
+    window: float = 0.010
+    """Seconds to wait for concurrent requests to batch together"""
+
+    _queue: queue.Queue = Factory(queue.Queue)
+    _estimators: dict[str, DepthEstimator] = Factory(dict)
+    _lock: threading.Lock = Factory(threading.Lock)
+
+    def estimator(self, name: str, options: dict[str, Any]) -> DepthEstimator:
+        """Cached estimator instance of the given type and settings, one across handler threads"""
+        key = json.dumps((name, options), sort_keys=True)
+        with self._lock:
+            if (key not in self._estimators):
+                self._estimators[key] = ESTIMATORS[name].model_validate(options)
+            return self._estimators[key]
+
+    def worker(self) -> None:
+        while True:
+            jobs = [self._queue.get()]
+            deadline = (time.perf_counter() + self.window)
+
+            # Gather concurrent requests until full or timed out
+            while (sum(len(job.images) for job in jobs) < self.batch):
+                if (left := deadline - time.perf_counter()) <= 0:
+                    break
+                try:
+                    jobs.append(self._queue.get(timeout=left))
+                except queue.Empty:
+                    break
+
+            groups: dict[int, list[DepthServer.Job]] = defaultdict(list)
+            for job in jobs:
+                groups[id(job.estimator)].append(job)
+
+            for group in groups.values():
+                estimator = group[0].estimator
+                images = [image for job in group for image in job.images]
+                try:
+                    estimator.load_model()
+                    depths = list()
+                    for start in range(0, len(images), self.batch):
+                        depths.extend(estimator._estimate_batch(images[start:start+self.batch]))
+                except Exception as error:
+                    logger.error(f"Estimation failed: {error}")
+                    for job in group:
+                        job.future.set_exception(error)
+                    continue
+                for job in group:
+                    job.future.set_result(depths[:len(job.images)])
+                    depths = depths[len(job.images):]
+
+    def serve(self) -> None:
+        daemon = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self) -> None:
+                while True:
+                    try:
+                        header, images = recv(self.request)
+                    except (ConnectionError, struct.error):
+                        return
+                    try:
+                        job = DepthServer.Job(
+                            estimator=daemon.estimator(header["estimator"], header["options"]),
+                            images=images,
+                        )
+                        daemon._queue.put(job)
+                        send(self.request, dict(), job.future.result())
+                    except Exception as error:
+                        send(self.request, dict(error=repr(error)))
+
+        # Refuse to steal the socket of a running daemon
+        if self.socket.exists():
+            with contextlib.suppress(OSError), socket.socket(socket.AF_UNIX) as probe:
+                probe.connect(str(self.socket))
+                raise RuntimeError(f"An estimator daemon is already running at {self.socket}")
+            self.socket.unlink()
+
+        threading.Thread(target=self.worker, daemon=True).start()
+
+        with socketserver.ThreadingUnixStreamServer(str(self.socket), Handler) as server:
+            server.daemon_threads = True
+            logger.info(f"Serving depth estimators at {self.socket}")
+            try:
+                server.serve_forever()
+            finally:
+                self.socket.unlink(missing_ok=True)
+
+
+def serve(
+    socket: Annotated[Path, Parameter(
+        help="Unix socket path to listen on")] = SOCKET,
+    batch: Annotated[int, Parameter(
+        help="Maximum images forwarded through the model at once")] = 8,
+    window: Annotated[float, Parameter(
+        help="Milliseconds to wait for concurrent requests to batch together")] = 10.0,
+    preload: Annotated[bool, Parameter(
+        help="Load the default estimator before accepting requests")] = True,
+) -> None:
+    """Keep depth estimators loaded and serve requests over a unix socket"""
+    server = DepthServer(socket=socket, batch=batch, window=window/1000)
+    if (preload):
+        default = DepthAnythingV2()
+        server.estimator(type(default).__name__, default.model_dump(mode="json")).load_model()
+    server.serve()
+
+# ---------------------------------------------------------------------------- #
+
+class DepthRemote(DepthEstimator):
+    """Forwards estimation to a `depthflow serve-estimator` daemon, or runs in-process"""
+
+    socket: Path = SOCKET
+    """Unix socket path of the estimator daemon"""
+
+    kind: Literal["da1", "da2", "onnx"] = "da2"
+    """The estimator to use, in the daemon or as a fallback (an estimator command before this one wins)"""
+
+    estimator: Annotated[SerializeAsAny[DepthEstimator], Parameter(parse=False)] = Field(default_factory=DepthAnythingV2)
+    """Settings of the kind's estimator, from the estimator command before this one on the CLI"""
+
+    _connection: Annotated[Optional[Any], Parameter(show=False)] = PrivateAttr(None)
+
+    @model_validator(mode="before")
+    @classmethod
+    def _select(cls, data: Any) -> Any:
+        """Build the estimator of the selected kind from its options, instances select their kind"""
+        if not isinstance(data, dict):
+            return data
+        data = dict(data)
+        if isinstance(estimator := data.get("estimator"), DepthEstimator):
+            kinds = {value: name for (name, value) in KINDS.items()}
+            if (kind := kinds.get(type(estimator))) is None:
+                raise ValueError(f"Can't forward a {type(estimator).__name__} estimator")
+            data["kind"] = kind
+        elif (kind := data.get("kind", "da2")) in KINDS:
+            data["estimator"] = KINDS[kind].model_validate(estimator or dict())
+        return data
+
+    def wrap(self, estimator: DepthEstimator) -> "DepthRemote":
+        """Forward the given estimator and settings instead"""
+        return type(self).model_validate(dict(self.model_dump(exclude={"kind", "estimator"}), estimator=estimator))
+
+    def __hash__(self) -> int:
+        return self.estimator.__hash__()
+
+    def load_model(self) -> None:
+        pass
+
+    def connect(self) -> Any:
+        if (self._connection is None):
+            if not hasattr(socket, "AF_UNIX"):
+                raise OSError("Unix sockets aren't supported on this platform")
+            connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                connection.connect(str(self.socket))
+            except OSError:
+                connection.close()
+                raise
+            self._connection = connection
+        return self._connection
+
+    def _estimate(self, image: np.ndarray) -> np.ndarray:
+        return self._estimate_batch([image])[0]
+
+    def _estimate_batch(self, images: list[np.ndarray]) -> list[np.ndarray]:
+        try:
+            connection = self.connect()
+            send(connection, dict(
+                estimator=type(self.estimator).__name__,
+                options=self.estimator.model_dump(mode="json"),
+            ), images)
+            header, depths = recv(connection)
+        except OSError as error:
+            logger.warn(f"Estimator daemon unavailable ({error}), estimating in-process")
+            if (self._connection is not None):
+                self._connection.close()
+            self._connection = None
+            self.estimator.load_model()
+            return self.estimator._estimate_batch(images)
+
+        if (error := header.get("error")):
+            raise RuntimeError(f"Estimator daemon failed: {error}")
+
+        return depths
+
+    def postprocess(self) -> DepthPost:
+        return self.estimator.postprocess()
+
+    @property
+    def resolution(self) -> Optional[int]:
+        return self.estimator.resolution
@@ -0,0 +1,99 @@
+import os
+
+import numpy as np
+import xxhash
+from pydantic import BaseModel, ConfigDict, Field
+
+import depthflow
+from depthflow.estimators.cache import DepthCache
+from depthflow.pyramid import texels
+
+LAYERS: DepthCache = DepthCache(
+    directory=depthflow.dirs.user_cache_path.joinpath("layers"),
+    size=int(os.getenv("DEPTHFILL_CACHE_SIZE_MB", 256))*(1024**2),
+    limit=int(os.getenv("DEPTHFILL_MEMORY_SIZE_MB", 128))*(1024**2),
+)
+"""Background layers apart from depthmaps, a few of them would evict all depthmaps"""
+
+
+class DepthFill(BaseModel):
+    """Inpainted background layer of an input, foreground near depth discontinuities replaced by
+    mirrored nearby background colors and depths. Built once on the CPU and cached with depthmaps,
+    the shader continues rays over steep gaps onto it, instead of stretching edges"""
+    model_config = ConfigDict(extra="forbid")
+
+    threshold: float = Field(default=0.04, gt=0.0, le=1.0)
+    """Minimum depth jump between neighbor pixels considered a discontinuity"""
+
+    radius: float = Field(default=0.1, gt=0.0, le=1.0)
+    """How far behind discontinuities the foreground is removed, fraction of the image height"""
+
+    def __hash__(self) -> int:
+        hasher = xxhash.xxh3_64()
+        hasher.update(f"{self.threshold}:{self.radius}")
+        return hasher.intdigest()
+
+    def key(self, image: np.ndarray, depth: np.ndarray, part: str) -> int:
+        """Cache key of a part of the layer of an input for current settings"""
+        hasher = xxhash.xxh3_64()
+        hasher.update(f"fill:{part}:{self.__hash__()}")
+        for array in (image, depth):
+            array = np.ascontiguousarray(array)
+            hasher.update(str((array.shape, array.dtype.str)))
+            hasher.update(memoryview(array).cast("B"))
+        return hasher.intdigest()
+
+    def layer(self, image: np.ndarray, depth: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Cached layer at the image's resolution, RGB uint8 colors and float32 depth"""
+        keys = (self.key(image, depth, "colors"), self.key(image, depth, "depth"))
+        colors, height = (LAYERS.get(keys[0]), LAYERS.get(keys[1]))
+        if (colors is None) or (height is None):
+            colors, height = self(image, depth)
+            LAYERS.set(keys[0], colors)
+            LAYERS.set(keys[1], height)
+        return (colors, height.astype(np.float32) * np.float32(1/65535))
+
+    def __call__(self, image: np.ndarray, depth: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Build the layer's RGB uint8 colors and uint16 depth"""
+        from scipy.ndimage import distance_transform_edt, maximum_filter, minimum_filter
+
+        # Work at the image's resolution, both are sampled by the same gluv
+        image = (np.repeat(image[..., None], 3, axis=2) if (image.ndim == 2) else image[..., :3])
+        height, width = image.shape[:2]
+        depth = texels(depth)
+
+        if (depth.shape != (height, width)):
+            from PIL import Image
+            depth = np.asarray(Image.fromarray(depth).resize(
+                size=(width, height), resample=Image.Resampling.BILINEAR))
+
+        # Discontinuities, and the background level around them
+        radius = max(1, round(self.radius * height))
+        edges = (maximum_filter(depth, size=3) - minimum_filter(depth, size=3)) > self.threshold
+        floor = minimum_filter(depth, size=(2*radius + 1))
+
+        # Foreground pixels near an edge, notably above their surroundings
+        distance = distance_transform_edt(~edges)
+        mask = (distance <= radius) & (depth > floor + self.threshold)
+
+        # Copy only from the background, excluding foreground twice as far as removed
+        beyond = minimum_filter(depth, size=(4*radius + 1))
+        exclude = mask | ((distance <= 2*radius) & (depth > beyond + self.threshold))
+
+        # Mirror removed pixels across their nearest source, continuing the
+        # background's texture, or repeat the nearest when the mirror is excluded
+        rows, cols = distance_transform_edt(exclude, return_distances=False, return_indices=True)
+        y, x = np.indices((height, width), sparse=True)
+        mirror_y = np.clip(2*rows - y, 0, height - 1)
+        mirror_x = np.clip(2*cols - x, 0, width - 1)
+        valid = ~exclude[mirror_y, mirror_x]
+        rows = np.where(mask, np.where(valid, mirror_y, rows), y)
+        cols = np.where(mask, np.where(valid, mirror_x, cols), x)
+
+        # Floats are 0..1 as uploaded, wider integers keep their high byte
+        colors = image[rows, cols]
+        if np.issubdtype(colors.dtype, np.floating):
+            colors = np.rint(np.clip(colors, 0.0, 1.0) * 255.0)
+        elif (colors.dtype != np.uint8):
+            colors = (colors >> (8*colors.dtype.itemsize - 8))
+        return (colors.astype(np.uint8, copy=False), np.rint(np.clip(depth[rows, cols], 0.0, 1.0) * 65535.0).astype(np.uint16))
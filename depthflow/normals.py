@@ -0,0 +1,23 @@
+import numpy as np
+
+from depthflow.pyramid import texels
+
+
+def gradients(depth: np.ndarray) -> np.ndarray:
+    """Per texel depth gradient in gluv units and its magnitude, shaped (height, width, 3) as
+    (d/dx, d/dy, slope) in the depthmap's top-down row order, with +y pointing up as in gluv"""
+    values = texels(depth)
+
+    # Texels are 2/height gluv units apart on both axes, see gtexture
+    spacing = 2.0 / values.shape[0]
+    result = np.empty((*values.shape, 3), dtype=np.float32)
+
+    if min(values.shape) < 2:
+        result[...] = 0.0
+        return result
+
+    dy, dx = np.gradient(values, spacing)
+    result[..., 0] = dx
+    result[..., 1] = -dy
+    np.hypot(dx, dy, out=result[..., 2])
+    return result
@@ -0,0 +1,32 @@
+import numpy as np
+
+
+def texels(depth: np.ndarray) -> np.ndarray:
+    """Float32 values of a depthmap as sampled by the shader's red channel"""
+    depth = (depth[..., 0] if (depth.ndim == 3) else depth)
+    if np.issubdtype(depth.dtype, np.integer):
+        return depth.astype(np.float32) / np.iinfo(depth.dtype).max
+    return depth.astype(np.float32)
+
+
+def _halve(array: np.ndarray, axis: int) -> np.ndarray:
+    """Max of texel pairs along an axis, the odd trailing texel folds into the last pair"""
+    if (length := array.shape[axis]) == 1:
+        return array
+    pairs = (length // 2) * 2
+    even = array.take(np.arange(0, pairs, 2), axis=axis)
+    np.maximum(even, array.take(np.arange(1, pairs, 2), axis=axis), out=even)
+    if (length % 2):
+        last = [slice(None)] * array.ndim
+        last[axis] = slice(-1, None)
+        np.maximum(even[tuple(last)], array.take([length - 1], axis=axis), out=even[tuple(last)])
+    return even
+
+
+def maxpyramid(depth: np.ndarray) -> list[np.ndarray]:
+    """Max-reduction mip chain of a depthmap, matching OpenGL level sizes (floor halving down to
+    1x1). A texel `i` is covered at level `L` by `min(i >> L, size(L) - 1)`, on any axis"""
+    levels = [texels(depth)]
+    while max(levels[-1].shape) > 1:
+        levels.append(_halve(_halve(levels[-1], 0), 1))
+    return levels
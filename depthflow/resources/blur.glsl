@@ -0,0 +1,38 @@
+// Separable depth of field, one axis per pass. Expects the definitions:
+// - DEPTHFLOW_BLUR_SOURCE: Texture with colors and normalized circle of confusion in alpha
+// - DEPTHFLOW_BLUR_AXIS: Unit direction of this pass, vec2(1, 0) or vec2(0, 1)
+
+void main() {
+
+    // Composite reads the parallax pass directly
+#ifndef DEPTHFLOW_BLUR
+    discard;
+#endif
+
+    vec4 center = texture(DEPTHFLOW_BLUR_SOURCE, astuv);
+
+    // Radius in gluv units as the single pass disk, to stuv on this axis
+    float radius = iBlurIntensity * center.a;
+    vec2 delta = DEPTHFLOW_BLUR_AXIS * radius / vec2(2.0*iAspectRatio, 2.0);
+
+    // Skip blurring within half a texel
+    if (length(delta * iResolution) < 0.5) {
+        fragColor = center;
+        return;
+    }
+
+    // Gaussian matching a disk's deviation, radius/2, over two sigmas
+    int taps = 2*iBlurQuality;
+    vec3 color = vec3(0.0);
+    float total = 0.0;
+
+    for (int i=-taps; i<=taps; i++) {
+        float walk = float(i)/float(taps);
+        float weight = exp(-2.0*walk*walk);
+        color += weight * texture(DEPTHFLOW_BLUR_SOURCE, astuv + walk*delta).rgb;
+        total += weight;
+    }
+
+    // Keep the center's confusion for the next axis
+    fragColor = vec4(color/total, center.a);
+}
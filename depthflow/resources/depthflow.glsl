@@ -20,6 +20,50 @@ struct DepthFlow {
     bool oob;
 };
 
+// Forward probes skipped at once over empty space, costs four fetches
+#define DEPTHFLOW_SPAN 8
+
+// Maximum value any bilinear depthmap sample between two gluv points could read, from the
+// max-reduction mip pyramid, infinite when crossing the mirrored repeat bounds
+float DepthMaxFootprint(vec2 a, vec2 b) {
+    vec2 bound = vec2(iWantAspect, 1.0);
+    if (any(greaterThan(abs(a), bound)) || any(greaterThan(abs(b), bound)))
+        return 1e9;
+
+    // Texels touched by bilinear filtering between the points, as in gtexture
+    ivec2 size = textureSize(maxdepth, 0);
+    vec2 scale = vec2(float(size.y)/float(size.x), 1.0);
+    vec2 ta = gluv2stuv(a*scale)*vec2(size) - 0.5;
+    vec2 tb = gluv2stuv(b*scale)*vec2(size) - 0.5;
+    ivec2 lo = clamp(ivec2(floor(min(ta, tb) - 1e-3)),     ivec2(0), size - 1);
+    ivec2 hi = clamp(ivec2(floor(max(ta, tb) + 1e-3)) + 1, ivec2(0), size - 1);
+
+    // Smallest level where the footprint spans at most two texels per axis,
+    // capped at the last one, a single texel of the global maximum
+    int last = 0;
+    while ((max(size.x, size.y) >> last) > 1)
+        last++;
+    int extent = max(hi.x - lo.x, hi.y - lo.y);
+    int level = 0;
+    while (((extent >> level) > 0) && (level < last))
+        level++;
+
+    ivec2 top = max(size >> level, ivec2(1)) - 1;
+    ivec2 c0 = min(lo >> level, top);
+    ivec2 c1 = min(hi >> level, top);
+    return max(
+        max(texelFetch(maxdepth, c0, level).r, texelFetch(maxdepth, ivec2(c1.x, c0.y), level).r),
+        max(texelFetch(maxdepth, ivec2(c0.x, c1.y), level).r, texelFetch(maxdepth, c1, level).r)
+    );
+}
+
+// Mirrored repeat sampling of the image, at the mip level of its minification
+vec4 DepthImage(vec2 gluv) {
+    vec2 resolution = textureSize(image, 0);
+    vec2 scale = vec2(resolution.y/resolution.x, 1);
+    return textureLod(image, gluv2stuv(gluv_mirrored_repeat(gluv)*scale), iDepthLod);
+}
+
 DepthFlow DepthMake(
     Camera camera,
     DepthFlow depth,
@@ -46,8 +90,10 @@ DepthFlow DepthMake(
     camera.origin += vec3(depth.origin, 0);
 
     // Point where the ray intersects with a fixed point pivoting around depth=steady
-    vec3 intersect = vec3(depth.center + camera.gluv, 1.0)
-        - vec3(camera.position.xy, 0.0) * (1.0/(1.0 - rel_steady)) * int(depth.sticky);
+    vec3 intersect = vec3(depth.center + camera.gluv, 1.0);
+#ifdef DEPTHFLOW_STICKY
+    intersect -= vec3(camera.position.xy, 0.0) * (1.0/(1.0 - rel_steady));
+#endif
 
     // The quality of the parallax effect is how tiny the steps are
     // Optimization: Low quality overshoot, high quality reverse
@@ -59,6 +105,9 @@ DepthFlow DepthMake(
     float last_value = 0.0;
     float walk = 0.0;
 
+    // Regular probes left before trying to skip again
+    int regular = 0;
+
     /* Main loop: Find the intersection with the scene */
     for (int stage=0; stage<2; stage++) {
         bool FORWARD  = (stage == 0);
@@ -69,6 +118,27 @@ DepthFlow DepthMake(
             if (FORWARD && walk > 1.0)
                 break;
 
+            // Optimization: Skip runs of probes that can't possibly hit the surface, exact as
+            // long as the probe after the run is still taken, accumulating walk identically
+            if (FORWARD && iDepthAccelerate && (depth.height > 0.0) && (regular-- <= 0)) {
+                float first = (walk + probe);
+                float end = walk;
+                for (int i=0; i<DEPTHFLOW_SPAN; i++)
+                    end += probe;
+
+                if (end <= 1.0) {
+                    vec3 a = mix(camera.origin, intersect, mix(safe, 1.0, first));
+                    vec3 b = mix(camera.origin, intersect, mix(safe, 1.0, end));
+                    float ceiling = min(1.0 - a.z, 1.0 - b.z);
+                    float surface = depth.height * DepthMaxFootprint(a.xy, b.xy);
+                    if (surface*(1.0 + 1e-5) + 1e-6 < ceiling) {
+                        walk = end;
+                        continue;
+                    }
+                    regular = DEPTHFLOW_SPAN;
+                }
+            }
+
             walk += (FORWARD ? probe : -quality);
 
             // Interpolate origin and intersect, starting at minimum safe distance
@@ -94,16 +164,38 @@ DepthFlow DepthMake(
         }
     }
 
-    // The gradient is always normal to a surface; assume the change
-    // of z is proportional to the maximum surface height
-    depth.normal = normalize(vec3(
-        (gtexture(depthmap, depth.gluv - vec2(quality, 0), true).r - depth.value) / quality,
-        (gtexture(depthmap, depth.gluv - vec2(0, quality), true).r - depth.value) / quality,
-        max(depth.height, quality)
-    ));
+    // Precomputed gradient and slope of the depthmap, a single fetch
+    if (iDepthNormals) {
+        vec3 slope = gtexture(gradient, depth.gluv, true).rgb;
+        float rise = max(depth.height, quality);
+        depth.normal = normalize(vec3(-slope.xy, rise));
+        depth.steep = depth.derivative * atan(slope.z, rise);
+
+    } else {
+        // The gradient is always normal to a surface; assume the change
+        // of z is proportional to the maximum surface height
+        depth.normal = normalize(vec3(
+            (gtexture(depthmap, depth.gluv - vec2(quality, 0), true).r - depth.value) / quality,
+            (gtexture(depthmap, depth.gluv - vec2(0, quality), true).r - depth.value) / quality,
+            max(depth.height, quality)
+        ));
+
+        // Heuristic to determine the perceptual steepness of the surface, 'gaps'
+        depth.steep = depth.derivative * angle(depth.normal, vec3(0, 0, 1));
+    }
 
-    // Heuristic to determine the perceptual steepness of the surface, 'gaps'
-    depth.steep = depth.derivative * angle(depth.normal, vec3(0, 0, 1));
+    // Continue rays over gaps onto the inpainted background layer, where
+    // they cross its surface, refined by a few fixed point iterations
+#ifdef DEPTHFLOW_INPAINT
+    if (iDepthFill && (iInpaint > 0.0) && (depth.steep > iInpaint)) {
+        float span = max(intersect.z - camera.origin.z, 1e-6);
+        for (int i=0; i<3; i++) {
+            depth.value = gtexture(backdepth, depth.gluv, true).r;
+            float along = (1.0 - depth.height*depth.value - camera.origin.z) / span;
+            depth.gluv = mix(camera.origin, intersect, along).xy;
+        }
+    }
+#endif
 
     return depth;
 }
@@ -133,82 +225,29 @@ void main() {
     GetCamera(iCamera);
     GetDepthFlow(iDepth);
     DepthFlow depthflow = DepthMake(iCamera, iDepth, depth);
-    fragColor = gtexture(image, depthflow.gluv, true);
+    fragColor = DepthImage(depthflow.gluv);
 
+    // Note: Alpha is the normalized circle of confusion, read by the blur passes
     if (depthflow.oob) {
-        fragColor = vec4(vec3(0.0), 1);
+        fragColor = vec4(vec3(0.0), 0);
         return;
     }
 
     /* --------------------------------------- */
 
     // Inpaint masking
+#ifdef DEPTHFLOW_INPAINT
     if ((iInpaint > 0.0) && depthflow.steep > iInpaint) {
-        fragColor = vec4(0, 1, 0, 1);
-        return;
-    }
-
-    // Fixme: Ability to apply lens and blur on multi-pass (post-refactor and metaprograming overhaul)
-
-    // Lens distortion (Mutually exclusive with blur)
-    if (iLensIntensity > 0.0) {
-
-        // Define the base 'velocity' (intensity) of the effect
-        float decay = pow(0.62*length(agluv), (10 - 9*iLensDecay));
-        vec2 delta = (0.5*iLensIntensity) * normalize(agluv) * decay;
-        vec3 color = vec3(0);
-
-        // Integrate the color along the path, different speeds per channel
-        for (float i=0; i<1; i+=(1.0/iLensQuality)) {
-            color.r += gtexture(image, depthflow.gluv - (1*i*delta), true).r;
-            color.g += gtexture(image, depthflow.gluv - (2*i*delta), true).g;
-            color.b += gtexture(image, depthflow.gluv - (4*i*delta), true).b;
+        if (!iDepthFill) {
+            fragColor = vec4(0, 1, 0, 0);
+            return;
         }
-
-        // Normalize the color, as it grew with integration
-        fragColor.rgb = (color / iLensQuality);
-    }
-
-    // Depth of Field (Mutually exclusive with lens distortion)
-    else if (iBlurIntensity > 0.0) {
-        float intensity = iBlurIntensity * pow(smoothstep(iBlurStart, iBlurEnd, 1.0 - depthflow.value), iBlurExponent);
-        vec4 color = fragColor;
-
-        for (float angle=0.0; angle<TAU; angle+=TAU/iBlurDirections) {
-            for (float walk=1.0/iBlurQuality; walk<=1.001; walk+=1.0/iBlurQuality) {
-                vec2 displacement = vec2(cos(angle), sin(angle)) * walk * intensity;
-                color += gtexture(image, depthflow.gluv + displacement, true);
-            }
-        }
-        fragColor = color / (iBlurDirections*iBlurQuality);
-    }
-
-    // Vignette post processing
-    if (iVigIntensity > 0.0) {
-        vec2 away = astuv * (1.0 - astuv.yx);
-        float linear = iVigDecay * (away.x*away.y);
-        fragColor.rgb *= clamp(pow(linear, iVigIntensity), 0.0, 1.0);
+        fragColor.rgb = gtexture(background, depthflow.gluv, true).rgb;
     }
+#endif
 
-    // Colors post processing
-    float luminance;
-
-    /* Saturation */ if (iColorsSaturation != 1.0) {
-        vec3 _hsv = rgb2hsv(fragColor.rgb);
-        _hsv.y = clamp(_hsv.y * iColorsSaturation, 0.0, 1.0);
-        fragColor.rgb = hsv2rgb(_hsv);
-    }
-
-    /* Contrast */ if (iColorsContrast != 1.0) {
-        fragColor.rgb = clamp((fragColor.rgb - 0.5) * iColorsContrast + 0.5, 0.0, 1.0);
-    }
-
-    /* Brightness */ if (iColorsBrightness != 1.0) {
-        fragColor.rgb = clamp(fragColor.rgb * iColorsBrightness, 0.0, 1.0);
-    }
-
-    /* Sepia */ if (iColorsSepia != 0.0) {
-        luminance     = dot(fragColor.rgb, vec3(0.299, 0.587, 0.114));
-        fragColor.rgb = mix(fragColor.rgb, luminance*vec3(1.2, 1.0, 0.8), iColorsSepia);
-    }
+    // Depth of field blur amount, applied in separable passes
+#ifdef DEPTHFLOW_BLUR
+    fragColor.a = pow(smoothstep(iBlurStart, iBlurEnd, 1.0 - depthflow.value), iBlurExponent);
+#endif
 }
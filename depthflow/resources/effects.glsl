@@ -0,0 +1,77 @@
+// Final screen pass, lens distortion and color effects over the (blurred) parallax
+
+// Blurred result when depth of field is enabled
+vec4 DepthScreen(vec2 stuv) {
+#ifdef DEPTHFLOW_BLUR
+    return texture(iDepthBlurY, stuv);
+#else
+    return texture(iDepthParallax, stuv);
+#endif
+}
+
+void main() {
+    fragColor = DepthScreen(astuv);
+
+    // Lens distortion
+#ifdef DEPTHFLOW_LENS
+    if (iLensIntensity > 0.0) {
+
+        // Define the base 'velocity' (intensity) of the effect
+        float decay = pow(0.62*length(agluv), (10 - 9*iLensDecay));
+        vec2 delta = (0.5*iLensIntensity) * normalize(agluv) * decay;
+        delta /= vec2(2.0*iAspectRatio, 2.0);
+        vec3 color = vec3(0);
+
+        // Integrate the color along the path, different speeds per channel
+        for (float i=0; i<1; i+=(1.0/iLensQuality)) {
+            color.r += DepthScreen(astuv - (1*i*delta)).r;
+            color.g += DepthScreen(astuv - (2*i*delta)).g;
+            color.b += DepthScreen(astuv - (4*i*delta)).b;
+        }
+
+        // Normalize the color, as it grew with integration
+        fragColor.rgb = (color / iLensQuality);
+    }
+#endif
+
+    fragColor.a = 1.0;
+
+    // Vignette post processing
+#ifdef DEPTHFLOW_VIGNETTE
+    if (iVigIntensity > 0.0) {
+        vec2 away = astuv * (1.0 - astuv.yx);
+        float linear = iVigDecay * (away.x*away.y);
+        fragColor.rgb *= clamp(pow(linear, iVigIntensity), 0.0, 1.0);
+    }
+#endif
+
+    // Colors post processing
+    float luminance;
+
+#ifdef DEPTHFLOW_SATURATION
+    /* Saturation */ if (iColorsSaturation != 1.0) {
+        vec3 _hsv = rgb2hsv(fragColor.rgb);
+        _hsv.y = clamp(_hsv.y * iColorsSaturation, 0.0, 1.0);
+        fragColor.rgb = hsv2rgb(_hsv);
+    }
+#endif
+
+#ifdef DEPTHFLOW_CONTRAST
+    /* Contrast */ if (iColorsContrast != 1.0) {
+        fragColor.rgb = clamp((fragColor.rgb - 0.5) * iColorsContrast + 0.5, 0.0, 1.0);
+    }
+#endif
+
+#ifdef DEPTHFLOW_BRIGHTNESS
+    /* Brightness */ if (iColorsBrightness != 1.0) {
+        fragColor.rgb = clamp(fragColor.rgb * iColorsBrightness, 0.0, 1.0);
+    }
+#endif
+
+#ifdef DEPTHFLOW_SEPIA
+    /* Sepia */ if (iColorsSepia != 0.0) {
+        luminance     = dot(fragColor.rgb, vec3(0.299, 0.587, 0.114));
+        fragColor.rgb = mix(fragColor.rgb, luminance*vec3(1.2, 1.0, 0.8), iColorsSepia);
+    }
+#endif
+}
@@ -1,5 +1,10 @@
-import contextlib
-from collections.abc import Iterable
+import copy
+import itertools
+import json
+import math
+from collections import deque
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
 from pathlib import Path
 from typing import Annotated, Any, Optional
@@ -10,16 +15,25 @@ from cyclopts import Parameter
 from PIL.Image import Image as PilImage
 from shaderflow.message import ShaderMessage
 from shaderflow.scene import ShaderScene
+from shaderflow.shader import ShaderProgram
 from shaderflow.texture import ShaderTexture
-from shaderflow.variable import ShaderVariable
+from shaderflow.variable import ShaderVariable, Uniform
 
 import depthflow
+from depthflow.commands import COMMANDS, ESTIMATORS, GROUP
+from depthflow.adaptive import DepthAdaptive
+from depthflow.animation import PRESETS, DepthAnimation
+from depthflow.decode import decode, reducible
 from depthflow.estimators import DepthEstimator
-from depthflow.estimators.anything import (
-    DepthAnythingV1,
-    DepthAnythingV2,
-)
+from depthflow.inpaint import DepthFill
+from depthflow.normals import gradients
+from depthflow.pyramid import maxpyramid
+from depthflow.specialize import DepthSpecialize
 from depthflow.state import DepthState
+from depthflow.uniforms import DepthUniforms
+from depthflow.upload import DepthUpload
+from depthflow.variants import DepthVariant, VariantExport
+from depthflow.video import DepthVideo
 
 
 @define
@@ -28,27 +42,89 @@ class DepthScene(ShaderScene):
     state: DepthState = Factory(DepthState)
     """Parallax shader uniform values"""
 
-    estimator: DepthEstimator = Factory(DepthAnythingV2)
-    """Model used to estimate depthmaps from input images"""
+    _estimator: Optional[DepthEstimator] = field(default=None, repr=False)
+    """Model used to estimate depthmaps from input images (None for DepthAnythingV2 on first use)"""
+
+    @property
+    def estimator(self) -> DepthEstimator:
+        if (self._estimator is None):
+            from depthflow.estimators.anything import DepthAnythingV2
+            self._estimator = DepthAnythingV2()
+        return self._estimator
+
+    @estimator.setter
+    def estimator(self, value: DepthEstimator) -> None:
+        self._estimator = value
+
+    video: Optional[DepthVideo] = None
+    """Current video input streaming frames and depthmaps, if any"""
+
+    animation: Optional[DepthAnimation] = field(default=None, converter=DepthAnimation.load)
+    """Declarative animation of the state, a preset name, JSON file or inline JSON also work"""
+
+    draft: Optional[int] = None
+    """Decode JPEG inputs at a reduced size, shorter side no smaller than this (None for full)"""
+
+    accelerate: bool = True
+    """Skip empty space in the ray march with a max-depth pyramid, same results"""
+
+    normals: bool = False
+    """Precompute the depthmap's gradients on inputs, one fetch for surface normals and steepness"""
+
+    _normals: bool = field(default=False, init=False, repr=False)
+    """Whether the gradient texture matches the current depthmap"""
+
+    fill: Optional[DepthFill] = None
+    """Build an inpainted background layer on image inputs, shown over steep gaps when inpainting"""
+
+    _fill: bool = field(default=False, init=False, repr=False)
+    """Whether the background layer matches the current input"""
+
+    packed: bool = True
+    """Send the state as a uniform block updated on changes, instead of uniforms every frame.
+    Disable at creation for scenes yielding `state.pipeline()` themselves"""
+
+    adaptive: Optional[DepthAdaptive] = None
+    """Realtime quality controller for a frame time budget, if any"""
 
     def smartset(self, object: Any) -> Any:
         if isinstance(object, DepthEstimator):
+            from depthflow.estimators.remote import KINDS, DepthRemote
+
+            # Remotes forward the estimator command given before them
+            if isinstance(object, DepthRemote) and (type(self._estimator) in KINDS.values()):
+                object = object.wrap(self._estimator)
             self.estimator = object
         elif isinstance(object, DepthState):
             self.state = object
+        elif isinstance(object, DepthFill):
+            self.fill = object
         return object
 
     # ------------------------------------------------------------------------ #
 
-    def commands(self):
+    def __attrs_post_init__(self) -> None:
+        ShaderScene.__attrs_post_init__(self)
         self.cli.help = depthflow.__about__
+        self.cli["main"].help = next(help for (name, _, help) in COMMANDS if (name == "main"))
+
+    def commands(self):
         self.cli.version = depthflow.__version__
-        self.cli.command(self.input)
-        self.cli.command(DepthState, name="state", result_action=self.smartset)
 
-        with contextlib.nullcontext("🌊 Depth Estimator") as group:
-            self.cli.command(DepthAnythingV1, name="da1", group=group, result_action=self.smartset)
-            self.cli.command(DepthAnythingV2, name="da2", group=group, result_action=self.smartset)
+        for name, target, help in COMMANDS:
+            module, attribute = target.split(":")
+
+            # Note: Main is added by ShaderScene itself, after this
+            if (name == "main"):
+                continue
+            elif attribute.startswith("DepthScene."):
+                self.cli.command(getattr(self, attribute.split(".")[1]), name=name, help=help)
+            else:
+                self.cli.command(target, name=name, help=help, result_action=self.smartset)
+
+        # Note: Estimators are imported only when their command runs
+        for name, target, help in ESTIMATORS:
+            self.cli.command(target, name=name, help=help, group=GROUP, result_action=self.smartset)
 
     def input(self,
         image: Annotated[Optional[Path | PilImage | np.ndarray | str | BytesIO | bytes], Parameter(
@@ -57,9 +133,133 @@ class DepthScene(ShaderScene):
         depth: Annotated[Optional[Path | PilImage | np.ndarray | str | BytesIO | bytes], Parameter(
             help="Input depthmap of the image (None to estimate)",
             name=("--depth", "-d"))] = None,
+        draft: Annotated[Optional[int], Parameter(
+            help="Decode JPEGs at a reduced size, shorter side no smaller than this (None to keep)",
+            name=("--draft",))] = None,
     ) -> None:
         """Use the given image and depthmap on the scene"""
         self.initialize()
+        self.unstream()
+        image, depth = self.load(image, depth, draft=draft)
+
+        # Optional disocclusion fill, once per input
+        self._fill = (self.fill is not None)
+        layer = (self.fill.layer(image, depth) if (self.fill is not None) else None)
+
+        # Uploaded on the next frame, sized for the final resolution
+        self.upload.input(image, depth, layer)
+
+        # Match rendering resolution to image
+        self.resolution = self.upload.size
+
+    def _variants(self,
+        variant: Annotated[list[str], Parameter(
+            help="JSON of a variant's output, state, time and scene options, repeatable",
+            name=("--variant", "-v"))],
+        time: Annotated[float, Parameter(
+            help="Duration of variants without their own",
+            name=("--time", "-t"))] = 5.0,
+        fps: Annotated[float, Parameter(
+            help="Frames per second of all variants",
+            name=("--fps", "-f"))] = 60.0,
+        ssaa: Annotated[float, Parameter(
+            help="Super sampling anti aliasing factor",
+            name=("--ssaa", "-s"))] = 1.0,
+        width: Annotated[Optional[int], Parameter(
+            help="Width of the videos (None to keep or find by aspect ratio)",
+            name=("--width", "-w"))] = None,
+        height: Annotated[Optional[int], Parameter(
+            help="Height of the videos (None to keep or find by aspect ratio)",
+            name=("--height", "-h"))] = None,
+    ) -> None:
+        """Render many variants of the input in one frame loop, eg. -v '{"output": "a.mp4", "state": {"height": 0.3}}'"""
+        self.variants(
+            variants=(DepthVariant.parse(json.loads(item)) for item in variant),
+            time=time, fps=fps, ssaa=ssaa,
+            width=width, height=height,
+        )
+
+    def derive(self, depth: np.ndarray) -> None:
+        """Update textures derived from the current depthmap"""
+
+        # Levels in OpenGL's bottom-up row order, block alignment matters
+        levels = maxpyramid(np.flipud(depth))
+        self.maxdepth.from_numpy(np.flipud(levels[0]))
+        texture = self.maxdepth.texture
+        texture.build_mipmaps()
+        for level, data in enumerate(levels[1:], start=1):
+            texture.write(np.ascontiguousarray(data), level=level)
+
+        # Optional gradients texture, precomputed normals
+        self._normals = self.normals
+        if (self.normals):
+            DepthVideo.upload(self.gradient, gradients(depth))
+
+    def stream(self,
+        path: Annotated[Path, Parameter(
+            help="Input video file, depth is estimated and streamed in sync with time",
+            name=("--path", "-i"))],
+        batch: Annotated[int, Parameter(
+            help="Number of frames estimated at once",
+            name=("--batch", "-b"))] = 8,
+        smooth: Annotated[float, Parameter(
+            help="Temporal smoothing of depthmaps, weight of the previous frame (0 to disable)",
+            name=("--smooth", "-s"))] = 0.5,
+    ) -> None:
+        """Use a video's frames and estimated depthmaps on the scene"""
+        self.initialize()
+        self.unstream()
+        self.upload.clear()
+        self._fill = False
+        self.video = DepthVideo(scene=self, path=path, batch=batch, smooth=smooth)
+        self.video.update()
+
+        # Match rendering resolution to video
+        self.resolution = self.image.size
+
+    def unstream(self) -> None:
+        """Stop the current video input, if any"""
+        if (self.video is not None):
+            self.modules.remove(self.video)
+            self.video = None
+
+    def animate(self,
+        animation: Annotated[str, Parameter(
+            help=f"Preset ({', '.join(PRESETS)}), JSON file or inline JSON of tracks",
+            name=("--animation", "-a"))],
+    ) -> None:
+        """Animate the state with a built-in preset or a JSON timeline of keyframes and waves"""
+        self.animation = animation
+
+    def adapt(self,
+        budget: Annotated[Optional[float], Parameter(
+            help="Target frames per second (None for the scene's)",
+            name=("--budget", "-b"))] = None,
+        minimum: Annotated[float, Parameter(
+            help="Lowest quality to drop to, in percent",
+            name=("--minimum", "-m"))] = 10.0,
+        motion: Annotated[float, Parameter(
+            help="Fraction of the full quality allowed while the camera moves",
+            name=("--motion",))] = 0.5,
+        ssaa: Annotated[bool, Parameter(
+            help="Also lower SSAA when quality alone can't meet the budget",
+            name=("--ssaa",))] = False,
+    ) -> None:
+        """Lower quality in motion or on missed frames of realtime previews, full quality when idle"""
+        self.initialize()
+        if (self.adaptive is not None):
+            self.modules.remove(self.adaptive)
+        self.adaptive = DepthAdaptive(scene=self,
+            budget=budget, minimum=minimum,
+            motion=motion, ssaa=ssaa)
+
+    def load(self,
+        image: Optional[Path | PilImage | np.ndarray | str | BytesIO | bytes],
+        depth: Optional[Path | PilImage | np.ndarray | str | BytesIO | bytes]=None,
+        draft: Optional[int]=None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Decode and estimate an input to arrays ready for upload, without touching the GPU,
+        JPEGs at a reduced size of this call's draft (None for the scene's)"""
 
         # Default image, property of the original owners
         if (image is None):
@@ -72,45 +272,194 @@ class DepthScene(ShaderScene):
                 progressbar=True,
             ))
 
-        import imageio.v3 as imageio
+        # Optimization: Key files by their raw bytes, skips hashing the decoded image
+        key = (self.estimator.key(image) if (depth is None) and isinstance(image, Path) else None)
 
-        # Load estimate input image
-        if isinstance(image, PilImage):
-            image = np.array(image)
-        elif not isinstance(image, np.ndarray):
-            image = imageio.imread(image)
+        # Optimization: Reducible files (JPEGs) are estimated from themselves, decoded at model
+        # size on misses, otherwise a single full decode is shared with the estimator
+        minimum = (draft or self.draft)
+        if (key is not None) and (self.estimator.resolution or minimum) and reducible(image):
+            depth = self.estimator.estimate(image, key=key)
 
-        if depth is None:
-            depth = self.estimator.estimate(image)
-        elif isinstance(depth, PilImage):
-            depth = np.array(depth)
-        elif not isinstance(depth, np.ndarray):
-            depth = imageio.imread(depth)
+        image = decode(image, minimum=minimum)
 
-        self.image.from_numpy(image)
-        self.depth.from_numpy(depth)
+        if (depth is None):
+            depth = self.estimator.estimate(image, key=key)
+        else:
+            depth = decode(depth)
 
-        # Match rendering resolution to image
-        self.resolution = self.image.size
+        return (image, depth)
+
+    def prefetch(self, inputs: Iterable[Any], ahead: int=2) -> Iterator[tuple[Any, np.ndarray, np.ndarray]]:
+        """Yields (input, image, depth) of images while the next `ahead` ones are decoded and
+        estimated in a background thread, overlapping with rendering the current one"""
+        inputs  = iter(inputs)
+        pending = deque()
+        pool    = ThreadPoolExecutor(max_workers=1, thread_name_prefix="DepthPrefetch")
+
+        def submit() -> bool:
+            for item in itertools.islice(inputs, 1):
+                pending.append((item, pool.submit(self.load, item)))
+                return True
+            return False
+
+        try:
+            while True:
+                while (len(pending) <= ahead) and submit():
+                    pass
+                if (not pending):
+                    break
+                item, future = pending.popleft()
+                yield (item, *future.result())
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def variants(self,
+        variants: Iterable[DepthVariant],
+        *, time: float=5.0,
+        fps: float=60.0,
+        ssaa: float=1.0,
+        width: Optional[int]=None,
+        height: Optional[int]=None,
+        turbo: bool=True,
+        buffers: int=3,
+    ) -> list[Path]:
+        """Render many variants of the current input in one frame loop, each frame is rendered
+        once per variant with its state and piped to its own encoder, sharing the setup costs"""
+        variants = list(variants)
+        self.initialize()
+        self.exporting = self.freewheel = self.headless = True
+        self.realtime  = False
+        self.fps       = fps
+        self.time      = 0
+        self.relay(ShaderMessage.Shader.Compile)
+        self.scheduler.clear()
+
+        _width, _height = self.resize(width=width, height=height)
+        for module in self.modules:
+            module.setup()
+        self.ssaa = ssaa
+
+        # Note: Frames are driven here, the task is only for bookkeeping
+        self.vsync = self.scheduler.new(task=self.next, frequency=fps, freewheel=True)
+        base = (max((variant.time or 0) for variant in variants) or time)
+        exports: list[VariantExport] = list()
+
+        # Options of any variant are reset to these on the others, and after rendering
+        baseline = {name: getattr(self, name) for variant in variants for name in variant.options}
+        state, runtime = (self.state, self.runtime)
+
+        for variant in variants:
+            self.runtime = (variant.time or base)
+            export = VariantExport(scene=self, relay=False,
+                encoder=copy.deepcopy(self.ffmpeg), runtime=self.runtime)
+            export.ffmpeg_clean()
+            export.ffmpeg_sizes(width=_width, height=_height)
+            export.ffmpeg_output(variant.output)
+            export.make_buffers(buffers)
+            export.ffhook()
+            export.popen()
+            exports.append(export)
+
+        for frame in range(max(export.total_frames for export in exports)):
+            for variant, export in zip(variants, exports):
+                if (export.finished):
+                    continue
+
+                # Swap in the variant's context
+                self.runtime = export.runtime
+                self.state   = variant.state
+                for name, value in (baseline | variant.options).items():
+                    setattr(self, name, value)
+
+                self.time = (frame / fps)
+                self.next(dt=(1 / fps))
+                export.pipe(turbo=turbo)
+                export.update()
+
+                if (export.finished):
+                    export.finish()
+                    export.log_stats(output=variant.output)
+
+        self.state, self.runtime = (state, runtime)
+        for name, value in baseline.items():
+            setattr(self, name, value)
+
+        return [variant.output for variant in variants]
 
     # ------------------------------------------------------------------------ #
 
     image: ShaderTexture = field(init=False)
     depth: ShaderTexture = field(init=False)
+    maxdepth: ShaderTexture = field(init=False)
+    gradient: ShaderTexture = field(init=False)
+    background: ShaderTexture = field(init=False)
+    backdepth: ShaderTexture = field(init=False)
+
+    parallax: ShaderProgram = field(init=False)
+    """Projection pass, colors and depth of field confusion"""
+
+    blur: tuple[ShaderProgram, ShaderProgram] = field(init=False)
+    """Separable depth of field passes, horizontal then vertical"""
+
+    specialize: DepthSpecialize = field(init=False)
+    """Compiled shader variants of the enabled state features"""
+
+    uniforms: DepthUniforms = field(init=False)
+    """Packed uniform block of the state"""
+
+    upload: DepthUpload = field(init=False)
+    """Resolution aware uploads of the inputs"""
 
     def build(self) -> None:
         self.depth = ShaderTexture(scene=self, name="depth", anisotropy=1).repeat(False)
-        self.image = ShaderTexture(scene=self, name="image").repeat(False)
-        self.shader.fragment = (depthflow.resources/"depthflow.glsl")
+        self.image = ShaderTexture(scene=self, name="image", mipmaps=True).repeat(False)
+        self.maxdepth = ShaderTexture(scene=self, name="maxdepth", filter="nearest", anisotropy=1).repeat(False)
+        self.gradient = ShaderTexture(scene=self, name="gradient", anisotropy=1).repeat(False)
+        self.background = ShaderTexture(scene=self, name="background").repeat(False)
+        self.backdepth = ShaderTexture(scene=self, name="backdepth", anisotropy=1).repeat(False)
+
+        # Note: Programs render in reverse order of creation, screen one last
+        blur = (depthflow.resources/"blur.glsl").read_text()
+        vertical = ShaderProgram(scene=self, name="iDepthBlurY")
+        horizontal = ShaderProgram(scene=self, name="iDepthBlurX")
+        horizontal.fragment = ("#define DEPTHFLOW_BLUR_SOURCE iDepthParallax\n"
+            "#define DEPTHFLOW_BLUR_AXIS vec2(1, 0)\n" + blur)
+        vertical.fragment = ("#define DEPTHFLOW_BLUR_SOURCE iDepthBlurX\n"
+            "#define DEPTHFLOW_BLUR_AXIS vec2(0, 1)\n" + blur)
+        self.blur = (horizontal, vertical)
+        self.parallax = ShaderProgram(scene=self, name="iDepthParallax")
+        self.parallax.fragment = (depthflow.resources/"depthflow.glsl")
+        self.shader.fragment = (depthflow.resources/"effects.glsl")
+        for program in (self.parallax, *self.blur):
+            program.texture.repeat(False)
+        self.specialize = DepthSpecialize(scene=self)
+        self.uniforms = DepthUniforms(scene=self)
+        self.upload = DepthUpload(scene=self)
         self.runtime = 5.0
 
     def setup(self) -> None:
-        if self.image.is_empty():
+        if self.upload.empty and self.image.is_empty():
             self.input(None)
 
+    _timelines: dict = field(factory=dict, init=False, repr=False)
+    """Cached (animation, table) of recent animations by (id, fps, runtime), one per variant"""
+
+    def timeline(self) -> np.ndarray:
+        """Per-frame values table of the current animation"""
+        key = (id(self.animation), self.fps, self.runtime)
+        if (cached := self._timelines.get(key)) is None:
+            while len(self._timelines) >= 64:
+                self._timelines.pop(next(iter(self._timelines)))
+            table = self.animation.table(fps=self.fps, runtime=self.runtime)
+            cached = self._timelines[key] = (self.animation, table)
+        return cached[1]
+
     def update(self) -> None:
         # Animation code here!
-        ...
+        if (self.animation is not None):
+            table = self.timeline()
+            self.animation.apply(self.state, table[round(self.time * self.fps) % len(table)])
 
     def handle(self, message: ShaderMessage) -> None:
         ShaderScene.handle(self, message)
@@ -120,4 +469,9 @@ class DepthScene(ShaderScene):
 
     def pipeline(self) -> Iterable[ShaderVariable]:
         yield from ShaderScene.pipeline(self)
-        yield from self.state.pipeline()
+        yield Uniform("bool", "iDepthAccelerate", self.accelerate)
+        yield Uniform("bool", "iDepthNormals", self.normals and self._normals)
+        yield Uniform("bool", "iDepthFill", (self.fill is not None) and self._fill)
+        yield Uniform("float", "iDepthLod", max(0.0, math.log2(self.image.height / self.render_resolution[1])))
+        if not (self.packed):
+            yield from self.state.pipeline()
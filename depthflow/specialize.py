@@ -0,0 +1,79 @@
+from collections import OrderedDict
+from collections.abc import Iterable
+
+from attrs import Factory, define, field
+from shaderflow.message import ShaderMessage
+from shaderflow.module import ShaderModule
+from shaderflow.shader import ShaderProgram
+
+
+@define
+class DepthSpecialize(ShaderModule):
+    """Compiles the scene's programs with a #define per enabled state feature, so disabled effects
+    are removed from the shaders rather than branched over. Each combination compiles once, and is
+    swapped in whenever the state toggles features"""
+
+    limit: int = 16
+    """Maximum number of cached variants, least recently used are released"""
+
+    _key: tuple[str, ...] = field(default=None, repr=False)
+    """Features the current programs were compiled with"""
+
+    _cache: OrderedDict = Factory(OrderedDict)
+    """Compiled (program, vbo, vao) of each ShaderProgram uuid, per features"""
+
+    _stamp: tuple = field(default=None, repr=False)
+    """State values the features were last checked for"""
+
+    def features(self) -> tuple[str, ...]:
+        return tuple(self.scene.state.defines())
+
+    def programs(self) -> Iterable[ShaderProgram]:
+        yield from (module for module in self.scene.modules if isinstance(module, ShaderProgram))
+
+    def defines(self) -> Iterable[str]:
+        for name in self.features():
+            yield f"#define {name}"
+
+    def handle(self, message: ShaderMessage) -> None:
+        if isinstance(message, ShaderMessage.Shader.Compile):
+            self.release()
+            self._key = self.features()
+
+    def update(self) -> None:
+        if (self._key is None) or (stamp := (id(self.scene.state), self.scene.state.stamp)) == self._stamp:
+            return None
+        self._stamp = stamp
+
+        if (key := self.features()) == self._key:
+            return None
+
+        # Park the current variant, reuse or compile the new one
+        self._cache[self._key] = {program.uuid: (program.program, program.vbo, program.vao)
+            for program in self.programs()}
+
+        if (compiled := self._cache.pop(key, None)) is None:
+            self.log_debug(f"Compiling shader variant ({', '.join(key) or 'no features'})")
+            compiled = dict()
+
+        for program in self.programs():
+            if (objects := compiled.pop(program.uuid, None)) is not None:
+                program.program, program.vbo, program.vao = objects
+            else:
+                program.compile()
+
+        self._key = key
+
+        while len(self._cache) > self.limit:
+            self._free(self._cache.popitem(last=False)[1])
+
+    def release(self) -> None:
+        """Free all parked variants, current programs are kept"""
+        while (self._cache):
+            self._free(self._cache.popitem()[1])
+
+    @staticmethod
+    def _free(compiled: dict) -> None:
+        for objects in compiled.values():
+            for item in objects:
+                item.release()
@@ -1,12 +1,28 @@
+import itertools
 from typing import Iterable
 
-from pydantic import BaseModel, ConfigDict, Field
+from pydantic import BaseModel, ConfigDict, Field, PrivateAttr
 from shaderflow.variable import Uniform
 
+_stamps = itertools.count(1)
+
 
 class _BaseModel(BaseModel):
     model_config = ConfigDict(use_attribute_docstrings=True)
 
+    _stamp: int = PrivateAttr(default_factory=_stamps.__next__)
+    """Unique number of the current values, renewed on any field assignment"""
+
+    def __setattr__(self, name: str, value) -> None:
+        BaseModel.__setattr__(self, name, value)
+        if not name.startswith("_"):
+            self.__pydantic_private__["_stamp"] = next(_stamps)
+
+    @property
+    def stamp(self) -> int:
+        # Optimization: Private attributes lookups are slow
+        return self.__pydantic_private__["_stamp"]
+
 # ---------------------------------------------------------------------------- #
 
 class VignetteState(_BaseModel):
@@ -21,6 +37,10 @@ class VignetteState(_BaseModel):
         yield Uniform("float", "iVigIntensity", self.intensity)
         yield Uniform("float", "iVigDecay",     self.decay)
 
+    def defines(self) -> Iterable[str]:
+        if (self.intensity > 0):
+            yield "DEPTHFLOW_VIGNETTE"
+
 # ---------------------------------------------------------------------------- #
 
 class LensState(_BaseModel):
@@ -39,6 +59,10 @@ class LensState(_BaseModel):
         yield Uniform("float", "iLensDecay",     self.decay)
         yield Uniform("int",   "iLensQuality",   self.quality)
 
+    def defines(self) -> Iterable[str]:
+        if (self.intensity > 0):
+            yield "DEPTHFLOW_LENS"
+
 # ---------------------------------------------------------------------------- #
 
 class InpaintState(_BaseModel):
@@ -49,6 +73,10 @@ class InpaintState(_BaseModel):
     def pipeline(self) -> Iterable[Uniform]:
         yield Uniform("float", "iInpaint", self.limit)
 
+    def defines(self) -> Iterable[str]:
+        if (self.limit > 0):
+            yield "DEPTHFLOW_INPAINT"
+
 # ---------------------------------------------------------------------------- #
 
 class BlurState(_BaseModel):
@@ -66,10 +94,10 @@ class BlurState(_BaseModel):
     """Shaping exponent of the start and end interpolation"""
 
     quality: int = Field(default=4, ge=1, le=16)
-    """The quality of the effect (radial sampling steps)"""
+    """The quality of the effect (twice the samples on each side, per axis)"""
 
     directions: int = Field(default=16, ge=1, le=32)
-    """The quality of the effect (radial sampling directions)"""
+    """Unused since the separable blur passes, kept for compatibility"""
 
     def pipeline(self) -> Iterable[Uniform]:
         yield Uniform("float", "iBlurIntensity",  self.intensity/100)
@@ -79,6 +107,10 @@ class BlurState(_BaseModel):
         yield Uniform("int",   "iBlurQuality",    self.quality)
         yield Uniform("int",   "iBlurDirections", self.directions)
 
+    def defines(self) -> Iterable[str]:
+        if (self.intensity > 0):
+            yield "DEPTHFLOW_BLUR"
+
 # ---------------------------------------------------------------------------- #
 
 class ColorState(_BaseModel):
@@ -101,6 +133,16 @@ class ColorState(_BaseModel):
         yield Uniform("float", "iColorsBrightness", self.brightness/100)
         yield Uniform("float", "iColorsSepia",      self.sepia/100)
 
+    def defines(self) -> Iterable[str]:
+        if (self.saturation != 100):
+            yield "DEPTHFLOW_SATURATION"
+        if (self.contrast != 100):
+            yield "DEPTHFLOW_CONTRAST"
+        if (self.brightness != 100):
+            yield "DEPTHFLOW_BRIGHTNESS"
+        if (self.sepia != 0):
+            yield "DEPTHFLOW_SEPIA"
+
 # ---------------------------------------------------------------------------- #
 
 class DepthState(_BaseModel):
@@ -152,6 +194,23 @@ class DepthState(_BaseModel):
         yield from self.color.pipeline()
         yield from self.blur.pipeline()
 
+    @property
+    def stamp(self) -> tuple[int, ...]:
+        """Changes whenever any value of the state or its sub-states is assigned"""
+        return (_BaseModel.stamp.fget(self),
+            self.vignette.stamp, self.lens.stamp, self.inpaint.stamp,
+            self.color.stamp, self.blur.stamp)
+
+    def defines(self) -> Iterable[str]:
+        """Names of the enabled shader features, compiled as specialized variants"""
+        if (self.sticky):
+            yield "DEPTHFLOW_STICKY"
+        yield from self.vignette.defines()
+        yield from self.lens.defines()
+        yield from self.inpaint.defines()
+        yield from self.color.defines()
+        yield from self.blur.defines()
+
     vignette: VignetteState = Field(default_factory=VignetteState)
     lens:     LensState     = Field(default_factory=LensState)
     inpaint:  InpaintState  = Field(default_factory=InpaintState)
@@ -0,0 +1,84 @@
+import struct
+import weakref
+from collections.abc import Iterable
+from typing import Any, Optional
+
+from attrs import define, field
+from shaderflow.module import ShaderModule
+from shaderflow.shader import ShaderProgram
+
+from depthflow.state import DepthState
+
+# GLSL type: (struct format, std140 alignment)
+STD140: dict[str, tuple[str, int]] = {
+    "float": ("f",  4),
+    "int":   ("i",  4),
+    "bool":  ("I",  4),
+    "vec2":  ("2f", 8),
+}
+
+
+@define
+class DepthUniforms(ShaderModule):
+    """The scene's DepthState packed in a std140 uniform block, repacked and uploaded only when a
+    value changes. Members keep their `Uniform` names, shaders read them the same way"""
+
+    name: str = "iDepthState"
+
+    binding: int = 1
+    """Uniform buffer binding point of the block"""
+
+    _layout: list[tuple[str, int]] = field(factory=list, repr=False)
+    """Struct format and byte offset of each uniform, in pipeline order"""
+
+    _declaration: str = field(default="", repr=False)
+    _data: bytearray = field(factory=bytearray, repr=False)
+    _buffer: Optional[Any] = field(default=None, repr=False)
+    _stamp: Optional[tuple] = field(default=None, repr=False)
+    _bound: weakref.WeakSet = field(factory=weakref.WeakSet, repr=False)
+
+    def build(self) -> None:
+        members, offset = list(), 0
+        for uniform in DepthState().pipeline():
+            format, align = STD140[uniform.type]
+            offset = (offset + align - 1) // align * align
+            members.append(f"    {uniform.type} {uniform.name};")
+            self._layout.append((format, offset))
+            offset += struct.calcsize(format)
+        self._data = bytearray((offset + 15) // 16 * 16)
+        self._declaration = "\n".join((
+            f"layout(std140) uniform {self.name} {{", *members, "};"))
+
+    def includes(self) -> Iterable[str]:
+        if (self.scene.packed):
+            yield self._declaration
+
+    def pack(self, state: DepthState) -> bytes:
+        for (format, offset), uniform in zip(self._layout, state.pipeline()):
+            value = uniform.value
+            struct.pack_into(format, self._data, offset, *(value if (format == "2f") else (value,)))
+        return self._data
+
+    def update(self) -> None:
+        if not (self.scene.packed):
+            return None
+
+        if (self._buffer is None):
+            self._buffer = self.scene.opengl.buffer(reserve=len(self._data), dynamic=True)
+
+        # Only repack and upload changed states
+        if (stamp := (id(self.scene.state), self.scene.state.stamp)) != self._stamp:
+            self._buffer.write(self.pack(self.scene.state))
+            self._stamp = stamp
+        self._buffer.bind_to_uniform_block(self.binding)
+
+        # Point (new) compiled programs to the binding once
+        for module in self.scene.modules:
+            if isinstance(module, ShaderProgram) and (module.program not in self._bound):
+                if (block := module.program.get(self.name, None)) is not None:
+                    block.binding = self.binding
+                self._bound.add(module.program)
+
+    def destroy(self) -> None:
+        if (self._buffer is not None):
+            self._buffer.release()
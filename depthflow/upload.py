@@ -0,0 +1,129 @@
+import math
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import numpy as np
+from attrs import define, field
+from PIL import Image
+from shaderflow.message import ShaderMessage
+from shaderflow.module import ShaderModule
+
+
+@define
+class DepthUpload(ShaderModule):
+    """Uploads the scene's inputs resampled to the size they're rendered at, within a memory
+    budget, rather than at their full resolution. Sources are kept on the CPU and re-uploaded
+    when the render resolution outgrows (or halves) the textures"""
+
+    headroom: float = 1.25
+    """Texels per rendered pixel to keep, margin for zoom and offsets"""
+
+    budget: int = 1024
+    """Maximum megabytes of input textures on the GPU"""
+
+    threads: int = 4
+    """Number of workers resampling inputs at once"""
+
+    _sources: Optional[tuple[np.ndarray, np.ndarray, Optional[tuple[np.ndarray, np.ndarray]]]] = field(default=None, repr=False)
+    """Full resolution image, depthmap and background layer (colors, depth) of the current input"""
+
+    _height: int = field(default=0, repr=False)
+    """Height the image was last uploaded at, zero when pending"""
+
+    @property
+    def size(self) -> tuple[int, int]:
+        """Resolution of the current input image"""
+        return (self._sources[0].shape[1], self._sources[0].shape[0])
+
+    @property
+    def empty(self) -> bool:
+        return (self._sources is None)
+
+    def input(self,
+        image: np.ndarray,
+        depth: np.ndarray,
+        layer: Optional[tuple[np.ndarray, np.ndarray]]=None,
+    ) -> None:
+        """Use new sources, uploaded on the next frame at the then render resolution"""
+        self._sources = (image, depth, layer)
+        self._height = 0
+
+    def clear(self) -> None:
+        """Forget the sources, for inputs uploaded elsewhere"""
+        self._sources = None
+        self._height = 0
+
+    # ------------------------------------------------------------------------ #
+
+    def texel(self) -> float:
+        """Approximate bytes per image texel of all input textures, with mipmaps"""
+        return (4*4/3) + 4 + (4*4/3) + (12*self.scene.normals) + ((3 + 4)*(self._sources[2] is not None))
+
+    def target(self) -> int:
+        """Image height to upload at for the current render resolution and budget"""
+        width, height = self.size
+        wanted = min(height, math.ceil(self.headroom * self.scene.render_resolution[1]))
+        limit = math.sqrt((self.budget * 1024**2) / (self.texel() * (width/height)))
+        return max(1, min(wanted, int(limit)))
+
+    def handle(self, message: ShaderMessage) -> None:
+        if isinstance(message, ShaderMessage.Shader.RecreateTextures):
+            if (self._sources is None) or (self._height == 0):
+                return
+
+            # Grow for detail when needed, shrink only when far oversized
+            target = self.target()
+            if (target > self._height) or (target < self._height/2):
+                self._height = 0
+
+    def update(self) -> None:
+        if (self._sources is not None) and (self._height == 0):
+            self.commit()
+
+    def commit(self) -> None:
+        """Resample and upload all sources at the target size"""
+        height = self.target()
+        image, depth, layer = self._sources
+
+        with ThreadPoolExecutor(max_workers=self.threads) as pool:
+            image = pool.submit(self.resample, image, height, Image.Resampling.LANCZOS)
+            depth = pool.submit(self.resample, depth, height, Image.Resampling.BOX)
+            layer = (pool.submit(self.resample, layer[0], height, Image.Resampling.LANCZOS),
+                pool.submit(self.resample, layer[1], height, Image.Resampling.BOX)) \
+                if (layer is not None) else None
+            image, depth = image.result(), depth.result()
+            layer = (tuple(part.result() for part in layer) if (layer is not None) else None)
+
+        if (height < self._sources[0].shape[0]):
+            self.log_debug(f"Uploading inputs at {image.shape[1]}x{image.shape[0]}, "
+                f"from {self.size[0]}x{self.size[1]}")
+
+        self.scene.image.from_numpy(image)
+        self.scene.image.texture.build_mipmaps()
+        self.scene.depth.from_numpy(depth)
+        self.scene.derive(depth)
+        if (layer is not None):
+            self.scene.background.from_numpy(layer[0])
+            self.scene.backdepth.from_numpy(layer[1])
+        self._height = height
+
+    @staticmethod
+    def resample(array: np.ndarray, height: int, filter: Image.Resampling) -> np.ndarray:
+        """Downscale an array to a height keeping its aspect, never upscales"""
+        if (array.shape[0] <= height):
+            return array
+        size = (max(1, round(array.shape[1] * height/array.shape[0])), height)
+
+        # Common formats directly, others channel-wise in float32
+        if (array.dtype == np.uint8) and (array.ndim == 2 or array.shape[2] in (3, 4)):
+            return np.asarray(Image.fromarray(array).resize(size, filter, reducing_gap=2.0))
+
+        channels = (array[..., None] if (array.ndim == 2) else array)
+        result = np.stack([np.asarray(Image.fromarray(channels[..., index].astype(np.float32))
+            .resize(size, filter, reducing_gap=2.0)) for index in range(channels.shape[2])], axis=2)
+
+        if np.issubdtype(array.dtype, np.integer):
+            info = np.iinfo(array.dtype)
+            result = np.clip(np.rint(result), info.min, info.max)
+        result = result.astype(array.dtype)
+        return (result[..., 0] if (array.ndim == 2) else result)
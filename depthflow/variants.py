@@ -0,0 +1,50 @@
+from pathlib import Path
+from typing import Any, Optional
+
+from attrs import Factory, define
+from shaderflow.exporting import ExportingHelper
+from shaderflow.ffmpeg import FFmpeg
+
+from depthflow.state import DepthState
+
+
+@define
+class DepthVariant:
+    """One animation of the current input, rendered alongside others in a single frame loop"""
+
+    output: Path
+    """Output video file name and format"""
+
+    state: DepthState = Factory(DepthState)
+    """Initial parallax state, animated independently of other variants"""
+
+    time: Optional[float] = None
+    """Duration of this variant (None to match the longest)"""
+
+    options: dict[str, Any] = Factory(dict)
+    """Scene attributes set before each of its frames, read by the animation in `update`"""
+
+    @classmethod
+    def parse(cls, data: dict) -> "DepthVariant":
+        return cls(
+            output=Path(data["output"]),
+            state=DepthState(**data.get("state", dict())),
+            time=data.get("time"),
+            options=data.get("options", dict()),
+        )
+
+
+@define
+class VariantExport(ExportingHelper):
+    """Exporting helper with its own encoder, instead of the scene's"""
+
+    encoder: FFmpeg = None
+    runtime: float = 0.0
+
+    @property
+    def ffmpeg(self) -> FFmpeg:
+        return self.encoder
+
+    @property
+    def total_frames(self) -> int:
+        return max(1, round(self.runtime * self.scene.fps))
@@ -0,0 +1,141 @@
+import itertools
+import subprocess
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+from attrs import define, field
+from shaderflow.ffmpeg import FFmpeg
+from shaderflow.module import ShaderModule
+from shaderflow.texture import ShaderTexture
+
+
+@define
+class DepthVideo(ShaderModule):
+    """Streams a video's frames and estimated depthmaps to the scene's textures, in sync with its
+    time. Only one batch of frames is ever in memory, regardless of the video length"""
+
+    name: str = "iDepthVideo"
+
+    path: Path = None
+    """Path to the video file"""
+
+    batch: int = 8
+    """Number of frames estimated at once"""
+
+    smooth: float = 0.5
+    """Temporal smoothing of depthmaps, weight of the previous frame (0 to disable)"""
+
+    fps: float = None
+    """Content framerate, auto calculated when None"""
+
+    _reader: Optional[Iterator[tuple[np.ndarray, np.ndarray]]] = field(default=None, repr=False)
+    """Internal (image, depth) iterable"""
+
+    _frames: int = 0
+    """Index of the next frame to be read"""
+
+    def __attrs_post_init__(self):
+        ShaderModule.__attrs_post_init__(self)
+        self.fps = (self.fps or FFmpeg.get_video_framerate(self.path))
+        self.seek(0)
+
+    @property
+    def duration(self) -> float:
+        return (FFmpeg.get_video_duration(self.path) or 0.0)
+
+    @property
+    def total(self) -> int:
+        """Number of frames in the video, from its duration"""
+        return max(1, round(self.duration * self.fps))
+
+    def frames(self, skip: int=0) -> Iterator[np.ndarray]:
+        """Decoded frames of the video, starting from `skip`. The decoder is stopped when the
+        generator is closed or collected, not only when the video ends"""
+        if (self.path is None) or not Path(self.path).exists():
+            return None
+        width, height = FFmpeg.get_video_resolution(self.path)
+        ffmpeg = (FFmpeg(vsync="cfr")
+            .quiet()
+            .input(path=self.path)
+            .filter(content=f"select='gte(n\\,{skip})'")
+            .rawvideo()
+            .no_audio()
+            .pipe_output(pixel_format="rgb24", format="rawvideo")
+        ).popen(stdout=subprocess.PIPE)
+        try:
+            while (raw := ffmpeg.stdout.read(width * height * 3)):
+                yield np.frombuffer(raw, dtype=np.uint8).reshape((height, width, 3))
+        finally:
+            ffmpeg.kill()
+            ffmpeg.stdout.close()
+            ffmpeg.wait()
+
+    def estimate(self, frames: list[np.ndarray]) -> list[np.ndarray]:
+        """Processed depthmaps of frames, bypassing the depthmaps cache as frames never repeat"""
+        estimator = self.scene.estimator
+        estimator.load_model()
+        post = estimator.postprocess()
+        return [post(estimator.normalize(depth, dtype=np.uint16))
+            for depth in estimator._estimate_batch(frames)]
+
+    def stream(self, skip: int=0) -> Iterator[tuple[np.ndarray, np.ndarray]]:
+        """Yields (image, depth) of frames, estimated in batches and temporally smoothed"""
+        frames = self.frames(skip=skip)
+        previous = None
+
+        try:
+            while (chunk := list(itertools.islice(frames, self.batch))):
+                for image, depth in zip(chunk, self.estimate(chunk)):
+                    if (previous is not None) and (previous.shape == depth.shape) and (self.smooth > 0):
+                        depth = self.temporal(previous, depth)
+                    yield (image, (previous := depth))
+        finally:
+            frames.close()
+
+    def temporal(self, previous: np.ndarray, depth: np.ndarray) -> np.ndarray:
+        """Align a relative depthmap's scale and shift to the previous frame, then blend them"""
+        mean = (depth.mean(), previous.mean())
+        variance = depth.var()
+        scale = ((depth * previous).mean() - mean[0]*mean[1]) / variance if (variance > 0) else 1.0
+        aligned = scale*(depth - mean[0]) + mean[1]
+        return np.clip(self.smooth*previous + (1 - self.smooth)*aligned, 0.0, 1.0, dtype=np.float32)
+
+    def seek(self, frame: int) -> None:
+        """Restart the stream at some frame, losing temporal history"""
+        if (self._reader is not None):
+            self._reader.close()
+        self._reader = self.stream(skip=frame)
+        self._frames = frame
+
+    def update(self) -> None:
+        target = (self.scene.frame if (self.scene.fps == self.fps) else int(self.scene.time * self.fps))
+        target %= self.total
+
+        # Looped or went back in time
+        if (target < self._frames - 1):
+            self.seek(target)
+
+        # Only write new frames when due, skipping late ones
+        latest = None
+        while (self._frames <= target) and (frame := next(self._reader, None)) is not None:
+            latest = frame
+            self._frames += 1
+
+        if (latest is not None):
+            self.upload(self.scene.image, latest[0])
+            self.upload(self.scene.depth, latest[1])
+            self.scene.derive(latest[1])
+
+    @staticmethod
+    def upload(texture: ShaderTexture, data: np.ndarray) -> None:
+        """Write to a texture, reallocating only if the format changes"""
+        components = (data.shape[2] if (data.ndim == 3) else 1)
+        if (texture.size == (data.shape[1], data.shape[0])) and (texture.components == components) \
+            and (texture.dtype == data.dtype):
+            texture.write(np.flipud(data).tobytes())
+        else:
+            texture.from_numpy(data)
+        if (texture.mipmaps):
+            texture.texture.build_mipmaps()
@@ -7,29 +7,10 @@
 # ]
 # ///
 
-import math
 from pathlib import Path
-from typing import Literal
 
-from attrs import define
-from depthflow.scene import DepthScene, DepthState
-
-
-@define
-class MyAnimation(DepthScene):
-    animation: Literal["circle", "zoom"] = "circle"
-
-    def update(self) -> None:
-        if self.animation == "circle":
-            self.state.isometric = 0.60
-            self.state.steady = 0.30
-            self.state.offset = (
-                0.5 * math.sin(self.cycle + math.pi/2.0),
-                0.5 * math.sin(self.cycle),
-            )
-
-        elif self.animation == "zoom":
-            self.state.height = 0.8 * (math.sin(self.cycle/2.0)**2.0)
+from depthflow.scene import DepthScene
+from depthflow.variants import DepthVariant
 
 
 def main():
@@ -37,28 +18,30 @@ def main():
     INPUTS  = Path("/home/tremeschin/Pictures/Wallpapers")
     OUTPUTS = Path(INPUTS/"DepthFlow")
 
-    scene = MyAnimation(backend="headless")
+    scene = DepthScene(backend="headless")
     scene.ffmpeg.h264(preset="veryfast")
 
-    for ext in ("jpg", "jpeg", "png"):
-        for file in Path(INPUTS).glob(f"*.{ext}"):
-            scene.input(image=file)
+    files = (file
+        for ext in ("jpg", "jpeg", "png")
+        for file in Path(INPUTS).glob(f"*.{ext}"))
 
-            # Animation variation one
-            scene.state = DepthState()
-            scene.animation = "circle"
-            scene.main(
-                output=(OUTPUTS/f"{file.stem}-circle.mp4"),
-                time=5, ssaa=1.5,
-            )
+    # Next inputs are estimated in the background while rendering
+    for file, image, depth in scene.prefetch(files, ahead=2):
+        scene.input(image=image, depth=depth)
 
-            # Animation variation two
-            scene.state = DepthState()
-            scene.animation = "zoom"
-            scene.main(
+        # Both animations are rendered in a single frame loop
+        scene.variants([
+            DepthVariant(
+                output=(OUTPUTS/f"{file.stem}-circle.mp4"),
+                options=dict(animation="circle"),
+                time=5,
+            ),
+            DepthVariant(
                 output=(OUTPUTS/f"{file.stem}-zoom.mp4"),
-                time=8, ssaa=1.5,
-            )
+                options=dict(animation="zoom"),
+                time=8,
+            ),
+        ], ssaa=1.5)
 
 if __name__ == "__main__":
     main()
@@ -37,7 +37,7 @@ class ExampleScene(DepthScene):
 
     def build(self):
         DepthScene.build(self)
-        self.shader.fragment = depthflow.resources.joinpath("depthflow.glsl").read_text().replace(
+        self.parallax.fragment = depthflow.resources.joinpath("depthflow.glsl").read_text().replace(
             "if (depthflow.oob) {", (SHADER_PATCH + "if (depthflow.oob) {")
         )
 
@@ -10,106 +10,31 @@
 import math
 import sys
 
-from attrs import define
+from depthflow.animation import DepthAnimation, Key, Keyframes, Set, Wave
 from depthflow.scene import DepthScene
 
-
-@define
-class Vertical(DepthScene):
-    """Simple vertical parallax"""
-    def update(self):
-        self.state.offset = (0.0, 0.80 * math.sin(self.cycle))
-        self.state.isometric = 0.60
-        self.state.steady = 0.30
-
-
-@define
-class Horizontal(DepthScene):
-    """Simple horizontal parallax"""
-    def update(self):
-        self.state.offset = (0.80 * math.sin(self.cycle), 0.0)
-        self.state.isometric = 0.60
-        self.state.steady = 0.30
-
-
-@define
-class Circle(DepthScene):
-    """Parallax in a circular motion"""
-    def update(self):
-        intensity = 0.50
-        self.state.isometric = 0.60
-        self.state.steady = 0.30
-        self.state.offset = (
-            intensity * math.sin(self.cycle + math.pi/2.0),
-            intensity * math.sin(self.cycle),
-        )
-
-
-@define
-class Dolly(DepthScene):
-    """Dolly zoom effect"""
-    def update(self):
-        self.state.height = 0.30
-        self.state.steady = 0.35
-        self.state.focus = 0.35
-        self.state.zoom = 0.95
-        self.state.isometric = 0.5 * (1.0 - math.cos(self.cycle))
-
-
-@define
-class Orbital(DepthScene):
-    """Orbital parallax around focus"""
-    def update(self):
-        self.state.steady = 0.30
-        self.state.focus = 0.30
-        self.state.zoom = 0.98
-        self.state.isometric = 0.50 * math.cos(self.cycle) + 0.75
-        self.state.offset = (0.50 * math.sin(self.cycle), 0.0)
-
-
-@define
-class Zoom(DepthScene):
-    """Zoom in and out"""
-    def update(self):
-        self.state.height = 0.8 * (math.sin(self.cycle/2.0)**2.0)
-
-
-@define
-class ZoomIn(DepthScene):
-    """Linear Zoom in effect"""
-    def update(self):
-        self.state.height = self.tau
-
-
-@define
-class ZoomInSmooth(DepthScene):
-    """Smoothed Zoom in effect"""
-    def update(self):
-        self.state.height = math.atan(2.0 * self.tau) * (2.0/math.pi)
-
-
-@define
-class ZoomOut(DepthScene):
-    """Linear Zoom out effect"""
-    def update(self):
-        self.state.height = 1.0 - self.tau
-
-
-@define
-class ZoomOutSmooth(DepthScene):
-    """Smoothed Zoom out effect"""
-    def update(self):
-        self.state.height = 1.0 - math.atan(2.0 * self.tau) * (2.0/math.pi)
-
+# Built-in presets by name: vertical, horizontal, circle, dolly, orbital, zoom, ...
+# Or create one, tracks are evaluated for all frames ahead of rendering
+Sway = DepthAnimation(tracks=[
+    Set(target="isometric", value=0.60),
+    Wave(target="offset.x", amplitude=0.50, frequency=2),
+    Wave(target="offset.y", amplitude=0.20, phase=math.pi/2.0),
+    Keyframes(target="height", keys=[
+        Key(time=0.0, value=0.0),
+        Key(time=0.5, value=0.4, ease="smooth"),
+        Key(time=1.0, value=0.0, ease="smooth"),
+    ]),
+])
 
 if __name__ == "__main__":
 
-    # Chose your scene above or create one!
-    scene = ZoomOut()
+    # Chose a preset name, an animation above or a json file!
+    scene = DepthScene(animation="zoom-out")
 
     # For: 'uv run presets.py input -i image.png main ...'
     scene.cli.meta(sys.argv[1:])
 
     # Programmatically
+    # scene.animation = Sway
     # scene.input(image=...)
     # scene.main(output="video.mp4")
@@ -0,0 +1,29 @@
+import subprocess
+import sys
+
+import pytest
+
+import depthflow
+
+
+def run(*arguments: str) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, "-m", "depthflow", *arguments],
+        capture_output=True, text=True, timeout=120)
+
+
+@pytest.mark.parametrize("command", ("da1", "da2", "onnx", "remote"))
+def test_estimator_help(command: str) -> None:
+    result = run(command, "--help")
+    assert (result.returncode == 0), result.stderr
+    assert ("--model" in result.stdout) or ("--kind" in result.stdout)
+
+
+def test_root_help() -> None:
+    """The fast root help lists the same commands and helps as the scene's own"""
+    fast = run("--help").stdout
+    real = subprocess.run([sys.executable, "-c", (
+        "from depthflow.scene import DepthScene\n"
+        "DepthScene(backend='headless').cli(['--help'])\n"
+    )], capture_output=True, text=True, timeout=120).stdout
+    assert (depthflow.__about__ in fast)
+    assert fast[fast.index(depthflow.__about__):] == real[real.index(depthflow.__about__):]
@@ -0,0 +1,52 @@
+import json
+import subprocess
+import sys
+import time
+
+import pytest
+
+# Budgets in seconds, best of a few fresh interpreters. Measured ~0.45s and ~0.30s
+# on a single core, with room for slower machines but not for the rendering stack
+BUDGETS: dict[str, tuple[list[str], float]] = {
+    "help":       (["-m", "depthflow", "--help"], 0.75),
+    "estimators": (["-c", "import depthflow.estimators"], 0.50),
+}
+
+# Modules that must stay out of each path
+HEAVY: tuple[str, ...] = (
+    "moderngl", "imgui_bundle", "shaderflow.scene", "diskcache",
+    "depthflow.scene", "depthflow.estimators.anything", "torch",
+)
+
+
+def best(arguments: list[str], repeat: int=5) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, *arguments], capture_output=True, check=True)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+@pytest.mark.parametrize("name", BUDGETS)
+def test_budget(name: str) -> None:
+    arguments, budget = BUDGETS[name]
+    took = best(arguments)
+    assert (took <= budget), f"Startup of {name} took {took*1000:.0f}ms, budget {budget*1000:.0f}ms"
+
+
+@pytest.mark.parametrize("name", BUDGETS)
+def test_lazy(name: str) -> None:
+    arguments, _ = BUDGETS[name]
+    code = (
+        "import runpy, sys, json, atexit\n"
+        "atexit.register(lambda: print('\\n' + json.dumps(sorted(sys.modules))))\n"
+    )
+    if (arguments[0] == "-m"):
+        code += f"sys.argv = {arguments[1:]!r}\nrunpy.run_module({arguments[1]!r}, run_name='__main__')\n"
+    else:
+        code += arguments[1]
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True).stdout
+    modules = set(json.loads(output.strip().splitlines()[-1]))
+    assert not (loaded := [module for module in HEAVY if module in modules]), \
+        f"Startup of {name} imported {loaded}"